@@ -1,8 +1,13 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Request, jsonify, request, send_from_directory
 from flask_cors import CORS
 from backend.config import Config
 from backend.database.db import db, init_db
+from backend.json_provider import OrjsonProvider
 import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+import hashlib
+import io
 import os
 
 # Import blueprints
@@ -13,11 +18,27 @@ from backend.routes.labeling import labeling_bp
 from backend.routes.training import training_bp
 
 
+class UploadRequest(Request):
+    """Request that keeps multipart file parts in memory
+
+    Werkzeug spools any form larger than 500KB to a temporary file, so each
+    multi-MB image was written to disk while parsing and read straight back
+    by the route. MAX_CONTENT_LENGTH already bounds the whole body, so
+    buffering it in memory costs at most that much per request.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
 def create_app(config_class=Config):
     """Create and configure Flask application"""
 
     app = Flask(__name__)
+    app.request_class = UploadRequest
+    config_class.load()
     app.config.from_object(config_class)
+    app.json = OrjsonProvider(app)
 
     # Initialize extensions
     CORS(app, resources={r"/api/*": {"origins": "*"}, r"/uploads/*": {"origins": "*"}})
@@ -33,6 +54,15 @@ def create_app(config_class=Config):
             api_secret=app.config['CLOUDINARY_API_SECRET']
         )
 
+        # The SDK's shared urllib3 pool keeps one connection per host, so
+        # concurrent crop uploads would each pay a fresh TLS handshake; size
+        # it to the upload pool so every worker's connection stays alive
+        if hasattr(cloudinary.uploader, '_http'):
+            cloudinary.uploader._http = cloudinary.utils.get_http_connector(
+                cloudinary.config(),
+                dict(cloudinary.CERT_KWARGS, maxsize=app.config['CLOUDINARY_UPLOAD_WORKERS'])
+            )
+
     # Create upload folder if using local storage
     if app.config['STORAGE_TYPE'] == 'local':
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -47,31 +77,47 @@ def create_app(config_class=Config):
     app.register_blueprint(labeling_bp)
     app.register_blueprint(training_bp)
 
+    def constant_json(payload):
+        """Serialize a constant payload once; responses carry an ETag for conditional GETs"""
+        body = app.json.dumps(payload)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+        def respond():
+            response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+            return response.make_conditional(request)
+
+        return respond
+
     # Health check endpoint
+    health_response = constant_json({
+        'status': 'healthy',
+        'service': 'Hebrew OCR Backend'
+    })
+
     @app.route('/health', methods=['GET'])
     def health_check():
-        return jsonify({
-            'status': 'healthy',
-            'service': 'Hebrew OCR Backend'
-        }), 200
+        return health_response()
 
     # Root endpoint
+    index_response = constant_json({
+        'message': 'Hebrew OCR Training System API',
+        'version': '1.0.0',
+        'endpoints': {
+            'upload': '/api/upload',
+            'enhance': '/api/enhance',
+            'segment_characters': '/api/segment/characters',
+            'segment_lines': '/api/segment/lines',
+            'label_characters': '/api/label/characters',
+            'transcribe_lines': '/api/transcribe/lines',
+            'train': '/api/train',
+            'train_status': '/api/train/status'
+        }
+    })
+
     @app.route('/', methods=['GET'])
     def index():
-        return jsonify({
-            'message': 'Hebrew OCR Training System API',
-            'version': '1.0.0',
-            'endpoints': {
-                'upload': '/api/upload',
-                'enhance': '/api/enhance',
-                'segment_characters': '/api/segment/characters',
-                'segment_lines': '/api/segment/lines',
-                'label_characters': '/api/label/characters',
-                'transcribe_lines': '/api/transcribe/lines',
-                'train': '/api/train',
-                'train_status': '/api/train/status'
-            }
-        }), 200
+        return index_response()
 
     # Serve uploaded files (for local storage)
     @app.route('/uploads/<path:filename>')
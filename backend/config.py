@@ -1,58 +1,114 @@
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Base directory for resolving relative paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+
+def _engine_options(database_url):
+    """Build SQLAlchemy engine options for the given database URL"""
+    if database_url.startswith('sqlite'):
+        # File databases gain nothing from a sized pool; allow connections to
+        # cross threads (the training thread shares the engine with requests)
+        return {
+            'pool_pre_ping': True,
+            'connect_args': {'check_same_thread': False},
+        }
+
+    return {
+        'pool_pre_ping': True,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+    }
+
+
 class Config:
-    """Application configuration"""
+    """Application configuration
+
+    Environment-dependent settings are resolved once by ``Config.load()``,
+    which ``create_app`` calls before ``app.config.from_object``.
+    """
 
     # Flask settings
-    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-    DEBUG = os.getenv('FLASK_DEBUG', 'True') == 'True'
+    SECRET_KEY = 'dev-secret-key-change-in-production'
+    DEBUG = True
 
     # Database settings - SQLite by default for local, PostgreSQL for production
-    DATABASE_URL = os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(BASE_DIR, "hebrew_ocr.db")}')
-    if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
-        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+    DATABASE_URL = f'sqlite:///{os.path.join(BASE_DIR, "hebrew_ocr.db")}'
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(DATABASE_URL)
 
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'tif', 'tiff', 'bmp'}
 
     # Storage settings - local by default
-    STORAGE_TYPE = os.getenv('STORAGE_TYPE', 'local')
-    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
+    STORAGE_TYPE = 'local'
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 
     # Cloudinary settings
-    CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
-    CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
-    CLOUDINARY_API_SECRET = os.getenv('CLOUDINARY_API_SECRET')
+    CLOUDINARY_CLOUD_NAME = None
+    CLOUDINARY_API_KEY = None
+    CLOUDINARY_API_SECRET = None
+    CLOUDINARY_UPLOAD_WORKERS = 16  # Concurrent uploads when saving segmented crops
 
     # Model settings
-    MODEL_PATH = os.getenv('MODEL_PATH', 'models/saved')
+    MODEL_PATH = 'models/saved'
     IMAGE_SIZE = (32, 32)  # Character image size for model input
     BATCH_SIZE = 32
     EPOCHS = 50
     LEARNING_RATE = 0.001
+    MIXED_PRECISION = False  # float16 compute; only faster on tensor-core GPUs
+    XLA_COMPILE = False  # Compile the training step with XLA (jit_compile)
 
     # Hebrew alphabet + space + common punctuation
-    HEBREW_CHARS = [
+    HEBREW_CHARS = (
         'א', 'ב', 'ג', 'ד', 'ה', 'ו', 'ז', 'ח', 'ט', 'י',
         'כ', 'ך', 'ל', 'מ', 'ם', 'נ', 'ן', 'ס', 'ע', 'פ',
         'ף', 'צ', 'ץ', 'ק', 'ר', 'ש', 'ת',
         ' ', '.', ',', '!', '?', '-', '"', "'"
-    ]
+    )
+    CHAR_TO_IDX = {char: idx for idx, char in enumerate(HEBREW_CHARS)}
     NUM_CLASSES = len(HEBREW_CHARS)
 
+    _loaded = False
+
+    @classmethod
+    def load(cls):
+        """Resolve environment settings (once per process)"""
+        if cls._loaded:
+            return cls
+
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        cls.SECRET_KEY = os.getenv('SECRET_KEY', cls.SECRET_KEY)
+        cls.DEBUG = os.getenv('FLASK_DEBUG', 'True') == 'True'
+
+        database_url = os.getenv('DATABASE_URL', cls.DATABASE_URL)
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+        cls.DATABASE_URL = database_url
+        cls.SQLALCHEMY_DATABASE_URI = database_url
+        cls.SQLALCHEMY_ENGINE_OPTIONS = _engine_options(database_url)
+
+        cls.STORAGE_TYPE = os.getenv('STORAGE_TYPE', cls.STORAGE_TYPE)
+        cls.UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', cls.UPLOAD_FOLDER)
+
+        cls.CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
+        cls.CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
+        cls.CLOUDINARY_API_SECRET = os.getenv('CLOUDINARY_API_SECRET')
+        cls.CLOUDINARY_UPLOAD_WORKERS = int(os.getenv('CLOUDINARY_UPLOAD_WORKERS', cls.CLOUDINARY_UPLOAD_WORKERS))
+
+        cls.MODEL_PATH = os.getenv('MODEL_PATH', cls.MODEL_PATH)
+        cls.MIXED_PRECISION = os.getenv('MIXED_PRECISION', 'False') == 'True'
+        cls.XLA_COMPILE = os.getenv('XLA_COMPILE', 'False') == 'True'
+
+        cls._loaded = True
+        return cls
+
     @staticmethod
     def init_app(app):
         """Initialize application with configuration"""
@@ -11,3 +11,8 @@ def init_db(app):
     db.init_app(app)
     with app.app_context():
         db.create_all()
+
+        # create_all() skips existing tables, so add any indexes they are missing
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
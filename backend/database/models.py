@@ -1,10 +1,35 @@
-from sqlalchemy import Integer, String, Float, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Integer, String, Float, Boolean, Text, DateTime, ForeignKey, Index, insert
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from typing import List, Optional
 from .db import db
 
-class Document(db.Model):
+class BulkCreateMixin:
+    """Batched multi-row INSERT ... RETURNING id for high-volume tables"""
+
+    @classmethod
+    def bulk_create(cls, session, rows):
+        """
+        Insert many rows in batched multi-row INSERTs
+
+        Args:
+            session: SQLAlchemy session (caller commits)
+            rows: List of column dictionaries
+
+        Returns:
+            List of new ids, in the same order as rows
+        """
+        if not rows:
+            return []
+
+        result = session.execute(
+            insert(cls).returning(cls.id, sort_by_parameter_order=True),
+            rows
+        )
+        return result.scalars().all()
+
+
+class Document(BulkCreateMixin, db.Model):
     __tablename__ = 'documents'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -30,8 +55,12 @@ class Document(db.Model):
         }
 
 
-class Character(db.Model):
+class Character(BulkCreateMixin, db.Model):
     __tablename__ = 'characters'
+    __table_args__ = (
+        Index('ix_characters_doc_valid', 'document_id', 'is_valid'),
+        Index('ix_characters_doc_group', 'document_id', 'group_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey('documents.id'), nullable=False)
@@ -65,8 +94,11 @@ class Character(db.Model):
         }
 
 
-class Line(db.Model):
+class Line(BulkCreateMixin, db.Model):
     __tablename__ = 'lines'
+    __table_args__ = (
+        Index('ix_lines_doc_order', 'document_id', 'line_order'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey('documents.id'), nullable=False)
@@ -94,6 +126,9 @@ class Line(db.Model):
 
 class TrainingRun(db.Model):
     __tablename__ = 'training_runs'
+    __table_args__ = (
+        Index('ix_training_runs_trained_at', 'trained_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     model_version: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -137,6 +172,10 @@ class BatchJob(db.Model):
 
 class BatchResult(db.Model):
     __tablename__ = 'batch_results'
+    __table_args__ = (
+        Index('ix_batch_results_job', 'batch_job_id'),
+        Index('ix_batch_results_doc', 'document_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     batch_job_id: Mapped[int] = mapped_column(Integer, ForeignKey('batch_jobs.id'), nullable=False)
@@ -7,11 +7,14 @@ bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
 backlog = 2048
 
 # Worker processes
+# Threaded workers let slow OCR/upload requests overlap (OpenCV and TF release
+# the GIL) and keep client connections alive between requests
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
 worker_connections = 1000
 timeout = 120
-keepalive = 5
+keepalive = 30
 
 # Logging
 accesslog = '-'
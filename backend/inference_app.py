@@ -2,6 +2,12 @@
 Hebrew OCR Inference API - Cloud Deployment
 Lightweight Flask app that loads a trained model and performs OCR.
 No database needed, no training - just inference.
+
+Each worker loads the latest model lazily on its first request (TensorFlow's
+runtime is not fork-safe, so nothing is loaded in a gunicorn master) and
+reloads it whenever latest.txt changes. Deploy with
+``gunicorn -w N -k gthread --threads T --keep-alive 30 backend.inference_app:app``
+so each worker serves T concurrent requests over kept-alive connections.
 """
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
@@ -9,48 +15,120 @@ import numpy as np
 import cv2
 import os
 import glob
+import shutil
+import tempfile
+import threading
 
 # Import model and services
+from backend.config import Config
 from backend.models.ocr_model import HebrewOCRModel, CharacterEncoder
 from backend.services.image_processing import ImageProcessor
 from backend.services.character_grouping import CharacterSegmenter
 from backend.services.line_segmentation import LineSegmenter
 
-# Hebrew characters
-HEBREW_CHARS = [
-    'א', 'ב', 'ג', 'ד', 'ה', 'ו', 'ז', 'ח', 'ט', 'י',
-    'כ', 'ך', 'ל', 'מ', 'ם', 'נ', 'ן', 'ס', 'ע', 'פ',
-    'ף', 'צ', 'ץ', 'ק', 'ר', 'ש', 'ת',
-    ' ', '.', ',', '!', '?', '-', '"', "'"
-]
-
 # Initialize
-char_encoder = CharacterEncoder(HEBREW_CHARS)
-ocr_model = HebrewOCRModel(num_classes=len(HEBREW_CHARS))
+char_encoder = CharacterEncoder(Config.HEBREW_CHARS)
+ocr_model = None  # Loaded on first use in each worker (see _current_model)
 
 # Load the latest trained model
 MODEL_DIR = os.getenv('MODEL_PATH', os.path.join(os.path.dirname(__file__), 'models', 'saved'))
 
 
-def load_latest_model():
-    """Find and load the latest trained model"""
-    model_files = glob.glob(os.path.join(MODEL_DIR, '*.keras'))
+# Guards loading/swapping of the shared model
+_model_lock = threading.Lock()
+model_loaded = False
+_load_attempted = False  # A load (successful or not) has run for _loaded_pointer_mtime
+_loaded_pointer_mtime = None  # mtime of latest.txt at the last load attempt
+
+
+# Pointer file naming the most recently uploaded model
+LATEST_POINTER = os.path.join(MODEL_DIR, 'latest.txt')
+
+
+def _write_latest_pointer(filepath):
+    """Atomically point latest.txt at the given model file"""
+    tmp_path = f"{LATEST_POINTER}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(os.path.basename(filepath))
+    os.replace(tmp_path, LATEST_POINTER)
+
+
+def _find_latest_model():
+    """Resolve the latest model via the pointer file, scanning MODEL_DIR only as a fallback"""
+    try:
+        with open(LATEST_POINTER) as f:
+            latest_model = os.path.join(MODEL_DIR, f.read().strip())
+        if os.path.isfile(latest_model):
+            return latest_model
+    except OSError:
+        pass
+
+    model_files = glob.glob(os.path.join(MODEL_DIR, '*.keras')) + glob.glob(os.path.join(MODEL_DIR, '*.tflite'))
     if not model_files:
+        return None
+
+    return max(model_files, key=os.path.getmtime)
+
+
+def _pointer_mtime():
+    """Modification time of latest.txt (None if there is no pointer yet)"""
+    try:
+        return os.stat(LATEST_POINTER).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_latest_model():
+    """Find and load the latest trained model into a new instance (None if there is none)"""
+    latest_model = _find_latest_model()
+    if latest_model is None:
         print("WARNING: No trained model found. OCR will not work until a model is uploaded.")
-        return False
+        return None
 
-    latest_model = max(model_files, key=os.path.getmtime)
-    ocr_model.load_model(latest_model)
+    model = HebrewOCRModel(num_classes=Config.NUM_CLASSES)
+    model.load_model(latest_model)
     print(f"Loaded model: {latest_model}")
-    return True
+    return model
+
+
+def _current_model():
+    """
+    Model this worker should serve (None if there is none), loading it on first use
+
+    Another worker may have uploaded a new model, so the pointer's mtime is
+    checked on every call (one stat). The model directory is only scanned
+    again when it moved, so a deployment without a model doesn't glob and
+    warn on every request.
+    """
+    global ocr_model, model_loaded, _load_attempted, _loaded_pointer_mtime
+
+    mtime = _pointer_mtime()
+    if _load_attempted and mtime == _loaded_pointer_mtime:
+        return ocr_model
+
+    with _model_lock:
+        if not _load_attempted or mtime != _loaded_pointer_mtime:
+            try:
+                model = load_latest_model()
+            except Exception as e:
+                print(f"WARNING: Failed to load model: {e}")
+                model = None
+            if model is not None:
+                ocr_model = model
+                model_loaded = True
+            _load_attempted = True
+            _loaded_pointer_mtime = mtime
+
+    return ocr_model
 
 
 def create_inference_app():
     app = Flask(__name__)
     CORS(app)
 
-    model_loaded = load_latest_model()
-
+    # index and health only report whether this worker has a model yet; they
+    # never trigger the (slow) TensorFlow load, which waits for the first OCR
+    # request so platform health probes stay fast
     @app.route('/', methods=['GET'])
     def index():
         return jsonify({
@@ -76,23 +154,21 @@ def create_inference_app():
         Request: multipart/form-data with 'file' field
         Response: { "text": "...", "characters": [...], "confidence": 0.95 }
         """
-        if not model_loaded:
+        model = _current_model()
+        if model is None:
             return jsonify({'error': 'No model loaded. Please upload a trained model.'}), 503
 
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
 
         file = request.files['file']
-        file_bytes = file.read()
+        file_bytes = file.stream.read()
 
-        # Load image
-        img = ImageProcessor.load_image_from_bytes(file_bytes)
+        # Load image (decoded directly to grayscale, scaled down if too large)
+        img, _ = ImageProcessor.load_fitted_image_from_bytes(file_bytes, grayscale=True)
         if img is None:
             return jsonify({'error': 'Invalid image'}), 400
 
-        # Resize if too large
-        img = ImageProcessor.resize_image(img)
-
         # Segment characters
         characters = CharacterSegmenter.segment_characters(img, min_area=20, max_area=10000)
 
@@ -102,25 +178,23 @@ def create_inference_app():
         # Sort in reading order (right-to-left for Hebrew)
         characters = CharacterSegmenter.sort_characters_reading_order(characters, rtl=True)
 
-        # Predict each character
-        results = []
-        total_confidence = 0
+        # Predict all characters in one batch
+        predicted_idxs, confidences = model.predict_batch([c['image'] for c in characters])
 
-        for char in characters:
-            char_img = char['image']
-            predicted_idx, confidence = ocr_model.predict_single(char_img)
-            predicted_char = char_encoder.decode(int(predicted_idx))
+        predicted_chars = char_encoder.decode_indices(predicted_idxs).tolist()
 
-            results.append({
+        results = [
+            {
                 'char': predicted_char,
-                'confidence': float(confidence),
+                'confidence': confidence,
                 'bbox': char['bbox']
-            })
-            total_confidence += confidence
+            }
+            for char, predicted_char, confidence in zip(characters, predicted_chars, confidences.tolist())
+        ]
 
         # Build text
-        text = ''.join([r['char'] for r in results])
-        avg_confidence = total_confidence / len(results) if results else 0
+        text = ''.join(predicted_chars)
+        avg_confidence = float(np.mean(confidences)) if results else 0
 
         return jsonify({
             'text': text,
@@ -137,39 +211,43 @@ def create_inference_app():
         Request: multipart/form-data with 'file' field
         Response: { "lines": [{"text": "...", "line_order": 0}, ...] }
         """
-        if not model_loaded:
+        model = _current_model()
+        if model is None:
             return jsonify({'error': 'No model loaded'}), 503
 
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
 
         file = request.files['file']
-        file_bytes = file.read()
+        file_bytes = file.stream.read()
 
-        img = ImageProcessor.load_image_from_bytes(file_bytes)
+        img, _ = ImageProcessor.load_fitted_image_from_bytes(file_bytes, grayscale=True)
         if img is None:
             return jsonify({'error': 'Invalid image'}), 400
 
-        img = ImageProcessor.resize_image(img)
-
         # Segment lines
         lines = LineSegmenter.segment_lines(img, min_line_height=10)
 
-        result_lines = []
+        # Segment characters from every line
+        line_chars = []
         for line_data in lines:
-            line_img = line_data['image']
+            chars = CharacterSegmenter.segment_characters(line_data['image'], min_area=10, max_area=5000)
+            line_chars.append(CharacterSegmenter.sort_characters_reading_order(chars, rtl=True))
 
-            # Segment characters from this line
-            chars = CharacterSegmenter.segment_characters(line_img, min_area=10, max_area=5000)
-            chars = CharacterSegmenter.sort_characters_reading_order(chars, rtl=True)
+        # Predict the characters of all lines in one batch
+        predicted_idxs, confidences = model.predict_batch(
+            [char['image'] for chars in line_chars for char in chars]
+        )
 
-            # Predict each character
-            line_text = ''
-            line_confidence = 0
-            for char in chars:
-                predicted_idx, confidence = ocr_model.predict_single(char['image'])
-                line_text += char_encoder.decode(int(predicted_idx))
-                line_confidence += confidence
+        predicted_chars = char_encoder.decode_indices(predicted_idxs).tolist()
+
+        result_lines = []
+        offset = 0
+        for line_data, chars in zip(lines, line_chars):
+            end = offset + len(chars)
+            line_text = ''.join(predicted_chars[offset:end])
+            line_confidence = float(np.sum(confidences[offset:end]))
+            offset = end
 
             avg_conf = line_confidence / len(chars) if chars else 0
 
@@ -191,26 +269,46 @@ def create_inference_app():
 
     @app.route('/api/model/upload', methods=['POST'])
     def upload_model():
-        """Upload a trained model (.keras file)"""
+        """Upload a trained model (.keras or quantized .tflite file)"""
         if 'model' not in request.files:
             return jsonify({'error': 'No model file provided'}), 400
 
         model_file = request.files['model']
-        if not model_file.filename.endswith('.keras'):
-            return jsonify({'error': 'Model must be a .keras file'}), 400
+        if not model_file.filename.endswith(('.keras', '.tflite')):
+            return jsonify({'error': 'Model must be a .keras or .tflite file'}), 400
 
         os.makedirs(MODEL_DIR, exist_ok=True)
-        filepath = os.path.join(MODEL_DIR, model_file.filename)
-        model_file.save(filepath)
+        filepath = os.path.join(MODEL_DIR, os.path.basename(model_file.filename))
+
+        # Stream to a hidden temp file (same extension, so load_model picks the
+        # right loader; dot-prefixed, so the *.keras/*.tflite fallback glob
+        # never sees it) in 1 MiB chunks, and only swap it in once it loads
+        fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, prefix='.upload-', suffix=os.path.splitext(filepath)[1])
 
-        # Reload model
-        nonlocal model_loaded
+        # Load into a fresh instance, then rebind; in-flight requests keep the old one
+        # Other workers pick the new model up when they see latest.txt change
+        global ocr_model, model_loaded, _load_attempted, _loaded_pointer_mtime
         try:
-            ocr_model.load_model(filepath)
-            model_loaded = True
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(model_file.stream, f, length=1 << 20)
+
+            new_model = HebrewOCRModel(num_classes=Config.NUM_CLASSES)
+            new_model.load_model(tmp_path)
+
+            with _model_lock:
+                os.replace(tmp_path, filepath)
+                _write_latest_pointer(filepath)
+                ocr_model = new_model
+                model_loaded = True
+                _load_attempted = True
+                _loaded_pointer_mtime = _pointer_mtime()
             return jsonify({'success': True, 'message': f'Model loaded: {model_file.filename}'})
         except Exception as e:
             return jsonify({'error': f'Failed to load model: {str(e)}'}), 500
+        finally:
+            # Gone after a successful replace; otherwise drop the rejected upload
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     return app
 
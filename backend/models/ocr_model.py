@@ -4,7 +4,9 @@ from tensorflow.keras import layers, models
 import numpy as np
 import cv2
 import os
+import threading
 from typing import List, Tuple
+from backend.config import Config
 
 class HebrewOCRModel:
     """TensorFlow/Keras model for Hebrew character recognition"""
@@ -20,9 +22,23 @@ class HebrewOCRModel:
         self.num_classes = num_classes
         self.image_size = image_size
         self.model = None
+        self._infer = None
+        self._interpreter = None
+        self._interpreter_lock = threading.Lock()
+
+    @staticmethod
+    def _apply_precision_policy():
+        """Select the Keras dtype policy from Config.MIXED_PRECISION"""
+        # Mixed precision (float16 compute, float32 variables) speeds up
+        # training on tensor-core GPUs; it is slower on plain CPUs
+        policy = 'mixed_float16' if Config.MIXED_PRECISION else 'float32'
+        if keras.mixed_precision.global_policy().name != policy:
+            keras.mixed_precision.set_global_policy(policy)
 
     def build_model(self):
         """Build CNN architecture for character recognition"""
+        self._apply_precision_policy()
+
         model = models.Sequential([
             # First convolutional block
             layers.Conv2D(32, (3, 3), activation='relu',
@@ -52,11 +68,12 @@ class HebrewOCRModel:
             layers.Dense(128, activation='relu'),
             layers.Dropout(0.5),
 
-            # Output layer
-            layers.Dense(self.num_classes, activation='softmax')
+            # Output layer (float32 so softmax stays stable under mixed precision)
+            layers.Dense(self.num_classes, activation='softmax', dtype='float32')
         ])
 
         self.model = model
+        self._infer = None
         return model
 
     def compile_model(self, learning_rate=0.001):
@@ -67,7 +84,8 @@ class HebrewOCRModel:
         self.model.compile(
             optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
             loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            jit_compile=Config.XLA_COMPILE
         )
 
     def train(self, X_train, y_train, X_val=None, y_val=None,
@@ -76,8 +94,8 @@ class HebrewOCRModel:
         Train the model
 
         Args:
-            X_train: Training images
-            y_train: Training labels
+            X_train: Training images (array or batched tf.data.Dataset)
+            y_train: Training labels (ignored when X_train is a Dataset)
             X_val: Validation images (optional)
             y_val: Validation labels (optional)
             epochs: Number of training epochs
@@ -90,21 +108,40 @@ class HebrewOCRModel:
         if self.model is None:
             self.compile_model()
 
+        if isinstance(X_train, np.ndarray):
+            # Overlap input copies of the next batch with compute on the current one
+            train_ds = self._make_dataset(X_train, y_train, batch_size, shuffle=True)
+        else:
+            train_ds = X_train
+
         validation_data = None
         if X_val is not None and y_val is not None:
-            validation_data = (X_val, y_val)
+            validation_data = self._make_dataset(X_val, y_val, batch_size, cache=True)
 
         history = self.model.fit(
-            X_train, y_train,
+            train_ds,
             validation_data=validation_data,
             epochs=epochs,
-            batch_size=batch_size,
             callbacks=callbacks,
             verbose=1
         )
 
         return history
 
+    @staticmethod
+    def _make_dataset(X, y, batch_size, shuffle=False, cache=False):
+        """Build a batched, prefetching tf.data pipeline from in-memory arrays"""
+        ds = tf.data.Dataset.from_tensor_slices((X, y))
+        if cache:
+            ds = ds.cache()
+        if shuffle:
+            ds = ds.shuffle(len(X))
+        ds = ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+        options = tf.data.Options()
+        options.experimental_optimization.map_parallelization = True
+        return ds.with_options(options)
+
     def predict(self, images):
         """
         Predict character classes for images
@@ -115,14 +152,14 @@ class HebrewOCRModel:
         Returns:
             Array of predicted class indices and confidence scores
         """
-        if self.model is None:
+        if self.model is None and self._interpreter is None:
             raise ValueError("Model not built or loaded")
 
         # Ensure correct shape
         if len(images.shape) == 3:
             images = np.expand_dims(images, axis=-1)
 
-        predictions = self.model.predict(images)
+        predictions = self._forward(images)
         predicted_classes = np.argmax(predictions, axis=1)
         confidences = np.max(predictions, axis=1)
 
@@ -147,6 +184,30 @@ class HebrewOCRModel:
 
         return classes[0], confidences[0]
 
+    def predict_batch(self, images):
+        """
+        Predict a list of character images in a single forward pass
+
+        Args:
+            images: List of images (H, W) or (H, W, 3) of any size
+
+        Returns:
+            Array of predicted class indices and confidence scores
+        """
+        if self.model is None and self._interpreter is None:
+            raise ValueError("Model not built or loaded")
+
+        if len(images) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        batch = self.preprocess_batch(images)
+
+        predictions = self._forward(batch)
+        predicted_classes = np.argmax(predictions, axis=1)
+        confidences = np.max(predictions, axis=1)
+
+        return predicted_classes, confidences
+
     def preprocess_image(self, img):
         """
         Preprocess image for model input
@@ -172,6 +233,30 @@ class HebrewOCRModel:
 
         return img
 
+    def preprocess_batch(self, images):
+        """
+        Preprocess a list of images into one preallocated model input batch
+
+        Args:
+            images: List of input images
+
+        Returns:
+            Float32 array of shape (N, H, W, 1) normalized to [0, 1]
+        """
+        w, h = self.image_size
+        out = np.empty((len(images), h, w, 1), dtype=np.float32)
+        resized = np.empty((h, w), dtype=np.uint8)
+
+        for i, img in enumerate(images):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+            cv2.resize(gray, self.image_size, dst=resized)
+            out[i, :, :, 0] = resized
+
+        # Normalize the whole batch in a single pass
+        np.multiply(out, np.float32(1 / 255.0), out=out)
+
+        return out
+
     def save_model(self, filepath):
         """Save model to file"""
         if self.model is None:
@@ -183,11 +268,93 @@ class HebrewOCRModel:
         self.model.save(filepath)
         print(f"Model saved to {filepath}")
 
+    def export_tflite(self, filepath, repr_dataset):
+        """
+        Export an int8-quantized TFLite model for CPU inference
+
+        Args:
+            filepath: Output .tflite path
+            repr_dataset: Representative float32 images (N, H, W, 1) used to
+                          calibrate the quantization ranges
+        """
+        if self.model is None:
+            raise ValueError("No model to export")
+
+        def representative_data_gen():
+            for img in repr_dataset[:500]:
+                yield [np.expand_dims(img, axis=0).astype(np.float32)]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_data_gen
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+        tflite_model = converter.convert()
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as f:
+            f.write(tflite_model)
+        print(f"TFLite model saved to {filepath}")
+
     def load_model(self, filepath):
-        """Load model from file"""
-        self.model = keras.models.load_model(filepath)
+        """Load model from file (.keras or quantized .tflite)"""
+        if filepath.endswith('.tflite'):
+            interpreter = tf.lite.Interpreter(model_path=filepath)
+            interpreter.allocate_tensors()
+            self.model = None
+            self._interpreter = interpreter
+        else:
+            self.model = keras.models.load_model(filepath)
+            self._interpreter = None
+        self._infer = None
         print(f"Model loaded from {filepath}")
 
+    def _invoke_tflite(self, images):
+        """Run the TFLite interpreter on a float32 batch and return probabilities"""
+        with self._interpreter_lock:
+            interpreter = self._interpreter
+            input_details = interpreter.get_input_details()[0]
+
+            if tuple(input_details['shape']) != images.shape:
+                interpreter.resize_tensor_input(input_details['index'], images.shape)
+                interpreter.allocate_tensors()
+                input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+
+            if input_details['dtype'] == np.int8:
+                scale, zero_point = input_details['quantization']
+                images = np.clip(np.round(images / scale + zero_point), -128, 127).astype(np.int8)
+
+            interpreter.set_tensor(input_details['index'], images)
+            interpreter.invoke()
+            predictions = interpreter.get_tensor(output_details['index'])
+
+        if output_details['dtype'] == np.int8:
+            scale, zero_point = output_details['quantization']
+            predictions = (predictions.astype(np.float32) - zero_point) * scale
+
+        return predictions
+
+    def _forward(self, images):
+        """Run the model on a float32 (N, H, W, 1) batch and return probabilities"""
+        if self._interpreter is not None:
+            return self._invoke_tflite(images)
+
+        if self._infer is None:
+            model = self.model
+
+            # Fixed signature: traced once, reused for every batch size
+            @tf.function(input_signature=[
+                tf.TensorSpec([None, self.image_size[1], self.image_size[0], 1], tf.float32)
+            ])
+            def _infer(x):
+                return model(x, training=False)
+
+            self._infer = _infer
+
+        return self._infer(tf.convert_to_tensor(images, dtype=tf.float32)).numpy()
+
     def save_weights(self, filepath):
         """Save model weights only"""
         if self.model is None:
@@ -238,10 +405,13 @@ class CharacterEncoder:
         Args:
             characters: List of characters (e.g., Hebrew alphabet)
         """
-        self.characters = characters
-        self.char_to_idx = {char: idx for idx, char in enumerate(characters)}
-        self.idx_to_char = {idx: char for idx, char in enumerate(characters)}
-        self.num_classes = len(characters)
+        self.characters = tuple(characters)
+        if self.characters == Config.HEBREW_CHARS:
+            self.char_to_idx = Config.CHAR_TO_IDX
+        else:
+            self.char_to_idx = {char: idx for idx, char in enumerate(self.characters)}
+        self.num_classes = len(self.characters)
+        self._chars_arr = np.array(self.characters)
 
     def encode(self, char):
         """Convert character to integer label"""
@@ -249,7 +419,7 @@ class CharacterEncoder:
 
     def decode(self, idx):
         """Convert integer label to character"""
-        return self.idx_to_char.get(idx, '')
+        return self.characters[idx] if 0 <= idx < self.num_classes else ''
 
     def encode_batch(self, chars):
         """Encode list of characters"""
@@ -259,6 +429,10 @@ class CharacterEncoder:
         """Decode list of indices"""
         return [self.decode(idx) for idx in indices]
 
+    def decode_indices(self, idx_array):
+        """Decode an array of in-range indices with a single NumPy gather"""
+        return self._chars_arr[np.asarray(idx_array, dtype=np.intp)]
+
     def get_num_classes(self):
         """Get number of character classes"""
         return self.num_classes
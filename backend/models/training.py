@@ -1,103 +1,133 @@
 import numpy as np
 import cv2
 from sklearn.model_selection import train_test_split
+import tensorflow as tf
 from tensorflow import keras
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Callable
 import json
+import math
 
-class DataAugmenter:
-    """Data augmentation for character images"""
+# Per-thread random generators: the legacy np.random functions share one
+# global RandomState behind a lock, which serializes threaded augmentation
+_rngs = threading.local()
 
-    @staticmethod
-    def rotate(img, angle_range=(-15, 15)):
-        """Rotate image by random angle"""
-        angle = np.random.uniform(angle_range[0], angle_range[1])
-        h, w = img.shape[:2]
-        center = (w // 2, h // 2)
-        M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        rotated = cv2.warpAffine(img, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
-        return rotated
-
-    @staticmethod
-    def scale(img, scale_range=(0.8, 1.2)):
-        """Scale image by random factor"""
-        scale_factor = np.random.uniform(scale_range[0], scale_range[1])
-        h, w = img.shape[:2]
-        new_h, new_w = int(h * scale_factor), int(w * scale_factor)
-
-        if new_h > 0 and new_w > 0:
-            scaled = cv2.resize(img, (new_w, new_h))
-
-            # Pad or crop to original size
-            if new_h < h or new_w < w:
-                # Pad
-                pad_h = max(0, h - new_h)
-                pad_w = max(0, w - new_w)
-                scaled = cv2.copyMakeBorder(scaled, pad_h // 2, pad_h - pad_h // 2,
-                                          pad_w // 2, pad_w - pad_w // 2,
-                                          cv2.BORDER_REPLICATE)
-            else:
-                # Crop
-                start_h = (new_h - h) // 2
-                start_w = (new_w - w) // 2
-                scaled = scaled[start_h:start_h + h, start_w:start_w + w]
-
-            return scaled
-        return img
 
-    @staticmethod
-    def add_noise(img, noise_level=10):
-        """Add Gaussian noise to image"""
-        noise = np.random.normal(0, noise_level, img.shape)
-        noisy = img + noise
-        noisy = np.clip(noisy, 0, 255).astype(np.uint8)
-        return noisy
+def _rng():
+    """Return this thread's np.random.Generator, creating it on first use"""
+    gen = getattr(_rngs, 'gen', None)
+    if gen is None:
+        gen = _rngs.gen = np.random.default_rng()
+    return gen
 
-    @staticmethod
-    def adjust_brightness(img, brightness_range=(-30, 30)):
-        """Adjust image brightness"""
-        brightness = np.random.uniform(brightness_range[0], brightness_range[1])
-        adjusted = cv2.convertScaleAbs(img, alpha=1.0, beta=brightness)
-        return adjusted
 
-    @staticmethod
-    def adjust_contrast(img, contrast_range=(0.8, 1.2)):
-        """Adjust image contrast"""
-        contrast = np.random.uniform(contrast_range[0], contrast_range[1])
-        adjusted = cv2.convertScaleAbs(img, alpha=contrast, beta=0)
-        return adjusted
+class DataAugmenter:
+    """Data augmentation for character images"""
 
     @staticmethod
-    def augment(img, augmentations=['rotate', 'scale', 'noise']):
+    def sample_batch_params(n, angle_range=(-15, 15), scale_range=(0.8, 1.2),
+                            noise_level=10, brightness_range=(0, 0), contrast_range=(1.0, 1.0)):
         """
-        Apply multiple augmentations to image
+        Draw per-image augmentation parameters for augment_batch
 
-        Args:
-            img: Input image
-            augmentations: List of augmentation types to apply
+        Defaults are rotate + scale + noise, with brightness and contrast left unchanged.
 
         Returns:
-            Augmented image
+            float32 array (n, 5): angle (degrees), scale, noise sigma, brightness, contrast
         """
-        aug_img = img.copy()
+        gen = _rng()
+        params = np.empty((n, 5), dtype=np.float32)
+        params[:, 0] = gen.uniform(angle_range[0], angle_range[1], n)
+        params[:, 1] = gen.uniform(scale_range[0], scale_range[1], n)
+        params[:, 2] = noise_level
+        params[:, 3] = gen.uniform(brightness_range[0], brightness_range[1], n)
+        params[:, 4] = gen.uniform(contrast_range[0], contrast_range[1], n)
+        return params
 
-        if 'rotate' in augmentations:
-            aug_img = DataAugmenter.rotate(aug_img)
+    @staticmethod
+    def augment_batch(imgs, params, chunk_size=1024, workers=None):
+        """
+        Augment a batch of same-size images in one vectorized pass
 
-        if 'scale' in augmentations:
-            aug_img = DataAugmenter.scale(aug_img)
+        Each pixel is bilinearly sampled through the image's combined
+        rotation + scale (replicated borders), then noise,
+        brightness and contrast are applied before a single clip.
 
-        if 'noise' in augmentations:
-            aug_img = DataAugmenter.add_noise(aug_img)
+        Chunks run on a thread pool: the NumPy kernels release the GIL, and
+        every chunk writes its own slice of the output, so no copies or
+        inter-process transfer are needed.
 
-        if 'brightness' in augmentations:
-            aug_img = DataAugmenter.adjust_brightness(aug_img)
+        Args:
+            imgs: uint8 array (N, H, W)
+            params: float32 array (N, 5) from sample_batch_params
+            chunk_size: Images processed per vectorized step (bounds memory)
+            workers: Thread count (default: CPU count)
 
-        if 'contrast' in augmentations:
-            aug_img = DataAugmenter.adjust_contrast(aug_img)
+        Returns:
+            Augmented uint8 array (N, H, W)
+        """
+        n = len(imgs)
+        out = np.empty_like(imgs)
+        starts = range(0, n, chunk_size)
+
+        # Independent noise stream per chunk, so threads never share a generator
+        seeds = _rng().integers(np.iinfo(np.int64).max, size=len(starts))
+
+        def run(i, start):
+            end = min(start + chunk_size, n)
+            DataAugmenter._augment_chunk(
+                imgs[start:end], params[start:end], out[start:end],
+                np.random.default_rng(seeds[i])
+            )
+
+        if len(starts) <= 1:
+            for i, start in enumerate(starts):
+                run(i, start)
+        else:
+            max_workers = min(workers or os.cpu_count() or 1, len(starts))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(run, range(len(starts)), starts))
+
+        return out
 
-        return aug_img
+    @staticmethod
+    def _augment_chunk(chunk, p, out, chunk_rng):
+        """Vectorized rotate/scale/noise/brightness/contrast for one chunk"""
+        n, h, w = chunk.shape
+
+        # Pixel offsets from the rotation center
+        cx, cy = w // 2, h // 2
+        ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+        dx, dy = xs - cx, ys - cy
+
+        # Inverse of getRotationMatrix2D(center, angle, scale): map output pixels to source
+        theta = np.deg2rad(p[:, 0])
+        cos = (np.cos(theta) / p[:, 1])[:, None, None]
+        sin = (np.sin(theta) / p[:, 1])[:, None, None]
+        src_x = np.clip(cx + cos * dx - sin * dy, 0, w - 1)
+        src_y = np.clip(cy + sin * dx + cos * dy, 0, h - 1)
+
+        x0 = src_x.astype(np.intp)
+        y0 = src_y.astype(np.intp)
+        x1 = np.minimum(x0 + 1, w - 1)
+        y1 = np.minimum(y0 + 1, h - 1)
+        fx = src_x - x0
+        fy = src_y - y0
+
+        b = np.arange(n)[:, None, None]
+        top = chunk[b, y0, x0] * (1 - fx) + chunk[b, y0, x1] * fx
+        bottom = chunk[b, y1, x0] * (1 - fx) + chunk[b, y1, x1] * fx
+        val = top * (1 - fy) + bottom * fy
+
+        # Noise, brightness, contrast fused into the same buffer
+        val += chunk_rng.standard_normal(val.shape, dtype=np.float32) * p[:, 2, None, None]
+        val += p[:, 3, None, None]
+        val *= p[:, 4, None, None]
+        np.clip(val, 0, 255, out=val)
+        np.rint(val, out=val)
+        out[:] = val
 
 
 class TrainingDataset:
@@ -118,6 +148,10 @@ class TrainingDataset:
         self.X = None
         self.y = None
 
+        # Reused scratch for color->gray conversion and the normalization constant
+        self._gray_buf = None
+        self._inv255 = np.float32(1.0 / 255.0)
+
     def prepare_data(self, augment=True, augment_factor=3):
         """
         Prepare training data
@@ -129,52 +163,108 @@ class TrainingDataset:
         Returns:
             X (images), y (labels)
         """
-        images = []
+        sources = []
         labels = []
 
         for char_data in self.characters_data:
-            img = char_data['image']
-            label = char_data['label']
-
             # Encode label
-            label_idx = self.char_encoder.encode(label)
+            label_idx = self.char_encoder.encode(char_data['label'])
             if label_idx == -1:
                 continue  # Skip unknown characters
 
-            # Preprocess image
-            img_processed = self._preprocess_image(img)
-            images.append(img_processed)
+            sources.append(char_data['image'])
             labels.append(label_idx)
 
-            # Augment
-            if augment:
-                for _ in range(augment_factor):
-                    aug_img = DataAugmenter.augment(img)
-                    aug_img_processed = self._preprocess_image(aug_img)
-                    images.append(aug_img_processed)
-                    labels.append(label_idx)
+        # Sizes are known up front: allocate X and y once and fill slots in place
+        n = len(sources)
+        copies = augment_factor if augment else 0
+        n_total = n * (1 + copies)
+        w, h = self.image_size
+        self.X = np.empty((n_total, h, w, 1), dtype=np.float32)
+        self.y = np.empty(n_total, dtype=np.int32)
+
+        # Resize originals once; augmentation runs on the resized batch
+        originals = np.empty((n, h, w), dtype=np.uint8)
+        for i, img in enumerate(sources):
+            self._preprocess_image(img, originals[i])
+
+        self._normalize(originals, self.X[:n, :, :, 0])
+        self.y[:n] = labels
+
+        # Augment
+        if copies > 0:
+            repeated = np.repeat(originals, copies, axis=0)
+            params = DataAugmenter.sample_batch_params(len(repeated))
+            self._normalize(DataAugmenter.augment_batch(repeated, params), self.X[n:, :, :, 0])
+            self.y[n:] = np.repeat(self.y[:n], copies)
 
-        self.X = np.array(images)
-        self.y = np.array(labels)
+        return self.X, self.y
 
-        # Add channel dimension
-        self.X = np.expand_dims(self.X, axis=-1)
+    def make_augmented_dataset(self, X, y, batch_size, augment_factor=3):
+        """
+        Build a training pipeline that augments on the fly
 
-        return self.X, self.y
+        Every epoch yields each image once as-is plus augment_factor
+        augmented copies, shuffled and drawn fresh per batch with
+        augment_batch. Only the originals stay in memory, and augmentation of
+        the next batches overlaps with training through prefetch.
 
-    def _preprocess_image(self, img):
-        """Preprocess single image"""
-        # Convert to grayscale if needed
+        Args:
+            X: Normalized images (N, H, W, 1), e.g. X_train from split_data()
+            y: Labels (N,)
+            batch_size: Batch size
+            augment_factor: Number of augmented copies per image per epoch
+
+        Returns:
+            Batched tf.data.Dataset of (images, labels)
+        """
+        # Back to uint8 for augment_batch; exact, since X holds u8 / 255
+        images = np.rint(X[..., 0] * 255).astype(np.uint8)
+        labels = np.asarray(y, dtype=np.int32)
+        n = len(images)
+        n_total = n * (1 + augment_factor)
+        h, w = images.shape[1:]
+
+        def load_batch(idx):
+            # Rows past the first n are augmented copies of row idx % n
+            src = idx % n
+            batch = images[src]
+            aug = idx >= n
+            if aug.any():
+                params = DataAugmenter.sample_batch_params(int(aug.sum()))
+                batch[aug] = DataAugmenter.augment_batch(batch[aug], params)
+
+            out = np.empty(batch.shape + (1,), dtype=np.float32)
+            self._normalize(batch, out[..., 0])
+            return out, labels[src]
+
+        def map_fn(idx):
+            batch_x, batch_y = tf.numpy_function(load_batch, [idx], (tf.float32, tf.int32))
+            batch_x.set_shape((None, h, w, 1))
+            batch_y.set_shape((None,))
+            return batch_x, batch_y
+
+        ds = (tf.data.Dataset.range(n_total)
+              .shuffle(n_total)
+              .batch(batch_size)
+              .map(map_fn, num_parallel_calls=tf.data.AUTOTUNE)
+              .prefetch(tf.data.AUTOTUNE))
+        return ds
+
+    def _preprocess_image(self, img, out):
+        """Resize a single image to grayscale image_size, writing into out (uint8 H x W)"""
+        # Convert to grayscale if needed, into a scratch buffer reused across same-size crops
         if len(img.shape) == 3:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if self._gray_buf is None or self._gray_buf.shape != img.shape[:2]:
+                self._gray_buf = np.empty(img.shape[:2], dtype=np.uint8)
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
 
         # Resize
-        img = cv2.resize(img, self.image_size)
-
-        # Normalize
-        img = img.astype('float32') / 255.0
+        cv2.resize(img, self.image_size, dst=out)
 
-        return img
+    def _normalize(self, images, out):
+        """Scale uint8 images to [0, 1] float32 directly into out (one pass, no temporaries)"""
+        np.multiply(images, self._inv255, out=out, dtype=np.float32)
 
     def split_data(self, test_size=0.2, val_size=0.1, random_state=42):
         """
@@ -186,32 +276,53 @@ class TrainingDataset:
         if self.X is None or self.y is None:
             raise ValueError("Data not prepared. Call prepare_data() first.")
 
-        # Split train and test
-        X_train_val, X_test, y_train_val, y_test = train_test_split(
-            self.X, self.y, test_size=test_size, random_state=random_state, stratify=self.y
+        # Split row indices (stratified when possible), then gather each set
+        # from X once instead of copying the whole tensor on every split
+        indices = np.arange(len(self.y))
+        train_val_idx, test_idx = train_test_split(
+            indices, test_size=test_size, random_state=random_state,
+            stratify=self._stratify_labels(self.y, test_size)
         )
 
-        # Split train and validation
         val_ratio = val_size / (1 - test_size)
-        X_train, X_val, y_train, y_val = train_test_split(
-            X_train_val, y_train_val, test_size=val_ratio, random_state=random_state, stratify=y_train_val
+        train_idx, val_idx = train_test_split(
+            train_val_idx, test_size=val_ratio, random_state=random_state,
+            stratify=self._stratify_labels(self.y[train_val_idx], val_ratio)
         )
 
+        X_train, X_val, X_test = self.X[train_idx], self.X[val_idx], self.X[test_idx]
+        y_train, y_val, y_test = self.y[train_idx], self.y[val_idx], self.y[test_idx]
+
         return X_train, X_val, X_test, y_train, y_val, y_test
 
+    @staticmethod
+    def _stratify_labels(y, test_size):
+        """
+        Labels to stratify a test_size split on, or None when it can't be stratified
+
+        A stratified split needs two samples of every class, and both sides
+        must hold at least one sample per class; small many-class datasets
+        (typical for retraining) fall back to a plain shuffled split.
+        """
+        counts = np.bincount(y)
+        counts = counts[counts > 0]
+        n_test = math.ceil(test_size * len(y))
+        n_train = len(y) - n_test
+        if counts.min(initial=2) < 2 or min(n_test, n_train) < len(counts):
+            return None
+        return y
+
     def get_class_distribution(self):
         """Get distribution of classes in dataset"""
         if self.y is None:
             raise ValueError("Data not prepared. Call prepare_data() first.")
 
-        unique, counts = np.unique(self.y, return_counts=True)
-        distribution = {}
-
-        for idx, count in zip(unique, counts):
-            char = self.char_encoder.decode(idx)
-            distribution[char] = int(count)
+        # Labels are non-negative class indices: an O(N) bincount, no sort
+        counts = np.bincount(self.y)
+        present = np.flatnonzero(counts)
+        chars = self.char_encoder.decode_indices(present)
 
-        return distribution
+        return dict(zip(chars.tolist(), counts[present].tolist()))
 
 
 class TrainingCallback(keras.callbacks.Callback):
@@ -266,14 +377,21 @@ class ModelTrainer:
         Returns:
             Training history and metrics
         """
-        # Prepare dataset
+        # Prepare dataset (augmented copies are generated per epoch, not stored)
         dataset = TrainingDataset(characters_data, self.char_encoder, self.model.image_size)
-        X, y = dataset.prepare_data(augment=augment)
+        X, y = dataset.prepare_data(augment=False)
 
         # Split data
         X_train, X_val, X_test, y_train, y_val, y_test = dataset.split_data()
 
-        print(f"Training set: {len(X_train)} samples")
+        augment_factor = 3 if augment else 0
+        if augment:
+            train_data = dataset.make_augmented_dataset(X_train, y_train, batch_size, augment_factor)
+        else:
+            train_data = X_train
+        num_samples = len(X_train) * (1 + augment_factor)
+
+        print(f"Training set: {num_samples} samples per epoch")
         print(f"Validation set: {len(X_val)} samples")
         print(f"Test set: {len(X_test)} samples")
 
@@ -304,7 +422,7 @@ class ModelTrainer:
 
         # Train
         history = self.model.train(
-            X_train, y_train,
+            train_data, y_train,
             X_val, y_val,
             epochs=epochs,
             batch_size=batch_size,
@@ -320,7 +438,7 @@ class ModelTrainer:
         return {
             'history': history.history,
             'test_metrics': test_metrics,
-            'num_samples': len(X_train),
+            'num_samples': num_samples,
             'class_distribution': class_dist
         }
 
@@ -338,23 +456,27 @@ class ModelTrainer:
         """
         # Prepare new dataset
         dataset = TrainingDataset(new_characters_data, self.char_encoder, self.model.image_size)
-        X, y = dataset.prepare_data(augment=True, augment_factor=5)
+        X, y = dataset.prepare_data(augment=False)
 
         # Split data
         X_train, X_val, _, y_train, y_val, _ = dataset.split_data()
 
+        augment_factor = 5
+        batch_size = 16
+        train_ds = dataset.make_augmented_dataset(X_train, y_train, batch_size, augment_factor)
+
         # Recompile with lower learning rate
         self.model.compile_model(learning_rate=learning_rate)
 
         # Train
         history = self.model.train(
-            X_train, y_train,
+            train_ds, y_train,
             X_val, y_val,
             epochs=epochs,
-            batch_size=16
+            batch_size=batch_size
         )
 
         return {
             'history': history.history,
-            'num_new_samples': len(X_train)
+            'num_new_samples': len(X_train) * (1 + augment_factor)
         }
@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import case, select, update
 from backend.database.db import db
 from backend.database.models import Character, Line, Document
 
 labeling_bp = Blueprint('labeling', __name__)
 
+# Matches the width of Character.label
+MAX_LABEL_LENGTH = 10
+
+
+def _is_int(value):
+    """True for JSON integers (bool is an int subclass but not an id)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
 
 @labeling_bp.route('/api/label/characters', methods=['POST'])
 def label_characters():
@@ -32,8 +41,12 @@ def label_characters():
             return jsonify({'error': 'labels required'}), 400
 
         labels = data['labels']
-        updated_count = 0
 
+        # Validate everything before touching the database
+        if not isinstance(labels, list) or not all(isinstance(entry, dict) for entry in labels):
+            return jsonify({'error': 'labels must be a list of objects'}), 400
+
+        payloads = []
         for label_data in labels:
             character_id = label_data.get('character_id')
             label = label_data.get('label')
@@ -41,28 +54,55 @@ def label_characters():
             if not character_id or not label:
                 continue
 
-            # Update character
-            character = Character.query.get(character_id)
-            if character:
-                character.label = label
-
-                # Update group_id if provided
-                if 'group_id' in label_data:
-                    character.group_id = label_data['group_id']
-
-                updated_count += 1
+            if not _is_int(character_id):
+                return jsonify({'error': f'Invalid character_id: {character_id!r}'}), 400
+
+            if not isinstance(label, str) or len(label) > MAX_LABEL_LENGTH:
+                return jsonify({'error': f'Invalid label for character {character_id}'}), 400
+
+            group_id = label_data.get('group_id')
+            if group_id is not None and not _is_int(group_id):
+                return jsonify({'error': f'Invalid group_id for character {character_id}'}), 400
+
+            payload = {'id': character_id, 'label': label}
+
+            # Update group_id if provided
+            if 'group_id' in label_data:
+                payload['group_id'] = label_data['group_id']
+
+            payloads.append(payload)
+
+        # The first entry names the document to mark labeled, even when its
+        # own label is empty, so its id is validated too
+        first_id = labels[0].get('character_id') if labels else None
+        if first_id is not None and not _is_int(first_id):
+            return jsonify({'error': f'Invalid character_id: {first_id!r}'}), 400
+
+        # One query to find which characters exist (and their documents)
+        requested_ids = {payload['id'] for payload in payloads}
+        if first_id:
+            requested_ids.add(first_id)
+        document_ids = dict(db.session.execute(
+            select(Character.id, Character.document_id).where(Character.id.in_(requested_ids))
+        ).all()) if requested_ids else {}
+
+        # Update characters in one executemany instead of a SELECT+UPDATE each
+        payloads = [payload for payload in payloads if payload['id'] in document_ids]
+        if payloads:
+            db.session.bulk_update_mappings(Character, payloads)
+        updated_count = len(payloads)
+
+        # Update document status (committed together with the labels)
+        if first_id in document_ids:
+            db.session.execute(
+                update(Document)
+                .where(Document.id == document_ids[first_id],
+                       Document.status == 'segmented')
+                .values(status='labeled')
+            )
 
         db.session.commit()
 
-        # Update document status
-        if labels:
-            first_char = Character.query.get(labels[0]['character_id'])
-            if first_char:
-                document = Document.query.get(first_char.document_id)
-                if document and document.status == 'segmented':
-                    document.status = 'labeled'
-                    db.session.commit()
-
         return jsonify({
             'success': True,
             'updated_count': updated_count
@@ -98,20 +138,17 @@ def label_group():
         if document_id is None or group_id is None or not label:
             return jsonify({'error': 'document_id, group_id, and label required'}), 400
 
-        # Update all characters in group
-        characters = Character.query.filter_by(
+        # Update all characters in group with a single UPDATE
+        updated_count = Character.query.filter_by(
             document_id=document_id,
             group_id=group_id
-        ).all()
-
-        for character in characters:
-            character.label = label
+        ).update({Character.label: label}, synchronize_session=False)
 
         db.session.commit()
 
         return jsonify({
             'success': True,
-            'updated_count': len(characters)
+            'updated_count': updated_count
         }), 200
 
     except Exception as e:
@@ -145,8 +182,8 @@ def transcribe_lines():
             return jsonify({'error': 'transcriptions required'}), 400
 
         transcriptions = data['transcriptions']
-        updated_count = 0
 
+        texts = {}
         for trans_data in transcriptions:
             line_id = trans_data.get('line_id')
             text = trans_data.get('text')
@@ -154,11 +191,18 @@ def transcribe_lines():
             if not line_id or text is None:
                 continue
 
-            # Update line
-            line = Line.query.get(line_id)
-            if line:
-                line.text = text
-                updated_count += 1
+            texts[line_id] = text
+
+        # Update all lines in one UPDATE ... SET text = CASE id WHEN ... END
+        updated_count = 0
+        if texts:
+            result = db.session.execute(
+                update(Line)
+                .where(Line.id.in_(texts))
+                .values(text=case(texts, value=Line.id))
+                .execution_options(synchronize_session=False)
+            )
+            updated_count = result.rowcount
 
         db.session.commit()
 
@@ -327,50 +371,61 @@ def export_labels(document_id):
         JSON with all character labels and line transcriptions
     """
     try:
-        document = Document.query.get(document_id)
+        filename = db.session.execute(
+            select(Document.filename).where(Document.id == document_id)
+        ).scalar_one_or_none()
 
-        if not document:
+        if filename is None:
             return jsonify({'error': 'Document not found'}), 404
 
         # Get all labeled characters
-        characters = Character.query.filter_by(
-            document_id=document_id,
-            is_valid=True
-        ).filter(Character.label.isnot(None)).all()
+        characters = db.session.execute(
+            select(
+                Character.id,
+                Character.label,
+                Character.group_id,
+                Character.bbox_x,
+                Character.bbox_y,
+                Character.bbox_w,
+                Character.bbox_h
+            ).where(
+                Character.document_id == document_id,
+                Character.is_valid == True,
+                Character.label.isnot(None)
+            )
+        ).all()
 
         char_labels = [
             {
-                'id': char.id,
-                'label': char.label,
-                'group_id': char.group_id,
+                'id': char_id,
+                'label': label,
+                'group_id': group_id,
                 'bbox': {
-                    'x': char.bbox_x,
-                    'y': char.bbox_y,
-                    'w': char.bbox_w,
-                    'h': char.bbox_h
+                    'x': x,
+                    'y': y,
+                    'w': w,
+                    'h': h
                 }
             }
-            for char in characters
+            for char_id, label, group_id, x, y, w, h in characters
         ]
 
         # Get all line transcriptions
-        lines = Line.query.filter_by(document_id=document_id).order_by(Line.line_order).all()
-
-        line_transcriptions = [
-            {
-                'id': line.id,
-                'line_order': line.line_order,
-                'text': line.text,
-                'y_start': line.bbox_y_start,
-                'y_end': line.bbox_y_end
-            }
-            for line in lines
-        ]
+        rows = db.session.execute(
+            select(
+                Line.id,
+                Line.line_order,
+                Line.text,
+                Line.bbox_y_start.label('y_start'),
+                Line.bbox_y_end.label('y_end')
+            ).where(Line.document_id == document_id).order_by(Line.line_order)
+        ).mappings().all()
+        line_transcriptions = [dict(row) for row in rows]
 
         return jsonify({
             'success': True,
             'document_id': document_id,
-            'filename': document.filename,
+            'filename': filename,
             'characters': char_labels,
             'lines': line_transcriptions,
             'total_characters': len(char_labels),
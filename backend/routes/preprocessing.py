@@ -2,14 +2,41 @@ from flask import Blueprint, request, jsonify
 from backend.database.db import db
 from backend.database.models import Document
 from backend.services.image_processing import ImageProcessor
+from backend.services.image_fetcher import ImageFetcher
 import cloudinary.uploader
 from backend.config import Config
 from datetime import datetime
+from functools import lru_cache
 import os
 
 preprocessing_bp = Blueprint('preprocessing', __name__)
 
 
+@lru_cache(maxsize=16)
+def _load_original(image_path):
+    """
+    Load and decode a document's original image, cached per process
+
+    Editing sessions call /api/enhance repeatedly for the same document, so
+    the download and decode are paid once. Originals are never overwritten
+    (every upload gets a new path), so the path alone is a safe cache key.
+    The array is returned read-only because it is shared between requests.
+    """
+    if Config.STORAGE_TYPE == 'cloudinary':
+        # Download from Cloudinary
+        img_url = cloudinary.utils.cloudinary_url(image_path)[0]
+        img = ImageFetcher.fetch_image(img_url)
+    else:
+        img = ImageProcessor.load_image_from_path(image_path)
+
+    if img is None:
+        # Raise instead of returning so failed loads are not cached
+        raise ValueError('Failed to load image')
+
+    img.setflags(write=False)
+    return img
+
+
 @preprocessing_bp.route('/api/enhance', methods=['POST'])
 def enhance_image():
     """
@@ -41,16 +68,9 @@ def enhance_image():
             return jsonify({'error': 'Document not found'}), 404
 
         # Load original image
-        if Config.STORAGE_TYPE == 'cloudinary':
-            # Download from Cloudinary
-            import requests
-            img_url = cloudinary.utils.cloudinary_url(document.original_image_path)[0]
-            response = requests.get(img_url)
-            img = ImageProcessor.load_image_from_bytes(response.content)
-        else:
-            img = ImageProcessor.load_image_from_path(document.original_image_path)
-
-        if img is None:
+        try:
+            img = _load_original(document.original_image_path)
+        except ValueError:
             return jsonify({'error': 'Failed to load image'}), 500
 
         # Get enhancement parameters
@@ -114,15 +134,9 @@ def save_enhanced_image():
             return jsonify({'error': 'Document not found'}), 404
 
         # Load original image
-        if Config.STORAGE_TYPE == 'cloudinary':
-            import requests
-            img_url = cloudinary.utils.cloudinary_url(document.original_image_path)[0]
-            response = requests.get(img_url)
-            img = ImageProcessor.load_image_from_bytes(response.content)
-        else:
-            img = ImageProcessor.load_image_from_path(document.original_image_path)
-
-        if img is None:
+        try:
+            img = _load_original(document.original_image_path)
+        except ValueError:
             return jsonify({'error': 'Failed to load image'}), 500
 
         # Apply enhancements
@@ -144,7 +158,6 @@ def save_enhanced_image():
         # Save enhanced image
         if Config.STORAGE_TYPE == 'cloudinary':
             import cv2
-            import io
             # Encode to bytes
             success, buffer = cv2.imencode('.png', enhanced_img)
             if not success:
@@ -152,7 +165,7 @@ def save_enhanced_image():
 
             # Upload to Cloudinary
             result = cloudinary.uploader.upload(
-                io.BytesIO(buffer),
+                buffer.tobytes(),
                 folder='hebrew_ocr/enhanced',
                 public_id=f"enhanced_{document_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             )
@@ -212,32 +225,14 @@ def auto_preprocess():
             return jsonify({'error': 'Document not found'}), 404
 
         # Load image
-        if Config.STORAGE_TYPE == 'cloudinary':
-            import requests
-            img_url = cloudinary.utils.cloudinary_url(document.original_image_path)[0]
-            response = requests.get(img_url)
-            img = ImageProcessor.load_image_from_bytes(response.content)
-        else:
-            img = ImageProcessor.load_image_from_path(document.original_image_path)
-
-        if img is None:
+        try:
+            img = _load_original(document.original_image_path)
+        except ValueError:
             return jsonify({'error': 'Failed to load image'}), 500
 
-        # Apply automatic preprocessing pipeline
-        # 1. Denoise
-        img = ImageProcessor.denoise(img, strength=10)
-
-        # 2. Auto-rotate if needed
-        img = ImageProcessor.auto_rotate(img)
-
-        # 3. Invert if needed
-        img = ImageProcessor.invert_if_needed(img)
-
-        # 4. Remove borders
-        img = ImageProcessor.remove_borders(img)
-
-        # 5. Adaptive threshold
-        img = ImageProcessor.adaptive_threshold(img)
+        # Apply automatic preprocessing pipeline:
+        # denoise -> auto-rotate -> invert -> remove borders -> adaptive threshold
+        img = ImageProcessor.auto_preprocess(img, strength=10)
 
         # Convert to base64
         img_base64 = ImageProcessor.image_to_base64(img)
@@ -2,17 +2,129 @@ from flask import Blueprint, request, jsonify
 from backend.database.db import db
 from backend.database.models import Document, Character, Line
 from backend.services.image_processing import ImageProcessor
+from backend.services.image_fetcher import ImageFetcher
 from backend.services.character_grouping import CharacterSegmenter
 from backend.services.line_segmentation import LineSegmenter
+from backend.services.crop_store import CropStore
+import cloudinary.exceptions
 import cloudinary.uploader
+import urllib3
 from backend.config import Config
+from sqlalchemy import select
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import os
 import cv2
-import io
+import time
 from datetime import datetime
 
 segmentation_bp = Blueprint('segmentation', __name__)
 
+# Upload failures worth retrying. The SDK reports 5xx responses and
+# socket/urllib3 failures as GeneralError and 420/429 as RateLimited; 4xx
+# errors (BadRequest, AuthorizationRequired, NotAllowed, ...) and config
+# errors (plain Error) would fail again
+_TRANSIENT_UPLOAD_ERRORS = (
+    cloudinary.exceptions.GeneralError,
+    cloudinary.exceptions.RateLimited,
+    urllib3.exceptions.HTTPError,
+    OSError,
+)
+
+
+@lru_cache(maxsize=1)
+def _cloudinary_url_prefix():
+    """
+    Delivery URL prefix for plain (untransformed, unsigned) Cloudinary images
+
+    Built once from a sample folder-style public id, so listings can append
+    public ids instead of running cloudinary_url per row.
+    """
+    sample = 'folder/public_id'
+    return cloudinary.utils.cloudinary_url(sample)[0][:-len(sample)]
+
+
+def _image_url(image_path):
+    """Public URL of a stored character or line image"""
+    if Config.STORAGE_TYPE == 'cloudinary':
+        return _cloudinary_url_prefix() + image_path
+
+    # Remove UPLOAD_FOLDER prefix to get relative path
+    return f"/uploads/{image_path.removeprefix(Config.UPLOAD_FOLDER).lstrip('/')}"
+
+
+def _upload_png(img, folder, public_id, compression=1, attempts=3):
+    """
+    Encode an image as PNG and upload it to Cloudinary
+
+    Transient failures (network errors, 5xx, rate limiting) are retried with
+    exponential backoff (1s, 2s, ...); anything else, such as a rejected
+    request or bad credentials, raises on the first attempt.
+
+    Returns:
+        Cloudinary upload result, or None if the image could not be encoded
+    """
+    success, buffer = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, compression])
+    if not success:
+        return None
+
+    # The SDK uploads raw bytes as-is; a BytesIO wrapper would just be read back out
+    data = buffer.tobytes()
+
+    for attempt in range(attempts):
+        try:
+            return cloudinary.uploader.upload(data, folder=folder, public_id=public_id)
+        except _TRANSIENT_UPLOAD_ERRORS:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _upload_pngs(images, folder, public_ids, compression=1):
+    """
+    Upload many images to Cloudinary concurrently
+
+    Each upload is a blocking HTTPS round-trip, so they run on a thread pool
+    instead of one after another.
+
+    Args:
+        images: Images to upload
+        folder: Cloudinary folder
+        public_ids: Public id per image
+        compression: PNG zlib level (0 = stored, still lossless)
+
+    Returns:
+        Upload results in input order (None where encoding failed)
+    """
+    if not images:
+        return []
+
+    max_workers = min(Config.CLOUDINARY_UPLOAD_WORKERS, len(images))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda img, public_id: _upload_png(img, folder, public_id, compression),
+            images, public_ids
+        ))
+
+
+def _save_pngs(images, paths, compression=1):
+    """
+    Write many images as PNG files concurrently
+
+    imwrite encodes and writes from native code without holding the GIL, so
+    crops are written on a thread pool instead of one after another.
+    """
+    if not images:
+        return
+
+    params = (cv2.IMWRITE_PNG_COMPRESSION, compression)
+    with ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, len(images))) as executor:
+        list(executor.map(
+            lambda img, path: ImageProcessor.save_image(img, path, params),
+            images, paths
+        ))
+
 
 @segmentation_bp.route('/api/segment/characters', methods=['POST'])
 def segment_characters():
@@ -46,10 +158,8 @@ def segment_characters():
         image_path = document.enhanced_image_path or document.original_image_path
 
         if Config.STORAGE_TYPE == 'cloudinary':
-            import requests
             img_url = cloudinary.utils.cloudinary_url(image_path)[0]
-            response = requests.get(img_url)
-            img = ImageProcessor.load_image_from_bytes(response.content)
+            img = ImageFetcher.fetch_image(img_url)
         else:
             img = ImageProcessor.load_image_from_path(image_path)
 
@@ -72,62 +182,81 @@ def segment_characters():
 
         print(f"Grouped into {len(groups)} clusters")
 
-        # Save characters to database and prepare response
-        result_groups = {}
-
-        for group_id, group_chars in groups.items():
-            result_groups[str(group_id)] = []
-
-            for char in group_chars:
-                # Save character image
-                char_img = char['image']
-
-                if Config.STORAGE_TYPE == 'cloudinary':
-                    # Upload to Cloudinary
-                    success, buffer = cv2.imencode('.png', char_img)
-                    if success:
-                        result = cloudinary.uploader.upload(
-                            io.BytesIO(buffer),
-                            folder=f'hebrew_ocr/characters/{document_id}',
-                            public_id=f"char_{char['id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                        )
-                        char_image_path = result['public_id']
-                        char_image_url = result['secure_url']
-                    else:
-                        continue
-                else:
-                    char_folder = os.path.join(Config.UPLOAD_FOLDER, f'characters/{document_id}')
-                    os.makedirs(char_folder, exist_ok=True)
-
-                    char_image_path = os.path.join(
-                        char_folder,
-                        f"char_{char['id']}.png"
-                    )
-                    ImageProcessor.save_image(char_img, char_image_path)
-                    char_image_url = f"/uploads/characters/{document_id}/char_{char['id']}.png"
-
-                # Save to database
-                character = Character(
-                    document_id=document_id,
-                    image_path=char_image_path,
-                    bbox_x=char['bbox']['x'],
-                    bbox_y=char['bbox']['y'],
-                    bbox_w=char['bbox']['w'],
-                    bbox_h=char['bbox']['h'],
-                    group_id=group_id,
-                    is_valid=True
-                )
-                db.session.add(character)
-                db.session.flush()
+        # Save character images, then insert all rows at once
+        flat_chars = [
+            (group_id, char)
+            for group_id, group_chars in groups.items()
+            for char in group_chars
+        ]
+
+        if Config.STORAGE_TYPE == 'cloudinary':
+            # Upload to Cloudinary
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            uploads = _upload_pngs(
+                [char['image'] for _, char in flat_chars],
+                f'hebrew_ocr/characters/{document_id}',
+                [f"char_{char['id']}_{timestamp}" for _, char in flat_chars],
+                # Glyphs are a few KB raw: skip DEFLATE, the round-trip dominates anyway
+                compression=0
+            )
+            saved = [
+                (result['public_id'], result['secure_url']) if result else None
+                for result in uploads
+            ]
+        else:
+            char_folder = os.path.join(Config.UPLOAD_FOLDER, f'characters/{document_id}')
+            os.makedirs(char_folder, exist_ok=True)
 
-                # Add to result
-                result_groups[str(group_id)].append({
-                    'id': character.id,
-                    'image_url': char_image_url,
-                    'bbox': char['bbox']
-                })
+            saved = [
+                (
+                    os.path.join(char_folder, f"char_{char['id']}.png"),
+                    f"/uploads/characters/{document_id}/char_{char['id']}.png"
+                )
+                for _, char in flat_chars
+            ]
+            _save_pngs(
+                [char['image'] for _, char in flat_chars],
+                [char_image_path for char_image_path, _ in saved],
+                compression=0
+            )
 
-        db.session.commit()
+        character_rows = []
+        character_results = []
+        character_images = []
+
+        for (group_id, char), saved_image in zip(flat_chars, saved):
+            if saved_image is None:
+                continue
+            char_image_path, char_image_url = saved_image
+
+            bbox = char['bbox']
+            character_rows.append({
+                'document_id': document_id,
+                'image_path': char_image_path,
+                'bbox_x': bbox['x'],
+                'bbox_y': bbox['y'],
+                'bbox_w': bbox['w'],
+                'bbox_h': bbox['h'],
+                'group_id': group_id,
+                'is_valid': True
+            })
+            character_results.append((group_id, char_image_url, bbox))
+            character_images.append(char['image'])
+
+        # Save to database
+        character_ids = Character.bulk_create(db.session, character_rows)
+
+        # Stacked model-size crops for training
+        CropStore.save(document_id, character_ids, character_images)
+
+        # Prepare response
+        result_groups = {str(group_id): [] for group_id in groups}
+        for character_id, (group_id, char_image_url, bbox) in zip(character_ids, character_results):
+            result_groups[str(group_id)].append({
+                'id': character_id,
+                'image_url': char_image_url,
+                'bbox': bbox
+            })
 
         # Update document status
         document.status = 'segmented'
@@ -177,10 +306,8 @@ def segment_lines():
         image_path = document.enhanced_image_path or document.original_image_path
 
         if Config.STORAGE_TYPE == 'cloudinary':
-            import requests
             img_url = cloudinary.utils.cloudinary_url(image_path)[0]
-            response = requests.get(img_url)
-            img = ImageProcessor.load_image_from_bytes(response.content)
+            img = ImageFetcher.fetch_image(img_url)
         else:
             img = ImageProcessor.load_image_from_path(image_path)
 
@@ -198,54 +325,64 @@ def segment_lines():
 
         print(f"Found {len(lines)} lines")
 
-        # Save lines to database
-        result_lines = []
-
-        for line_data in lines:
-            line_img = line_data['image']
-
-            # Save line image
-            if Config.STORAGE_TYPE == 'cloudinary':
-                success, buffer = cv2.imencode('.png', line_img)
-                if success:
-                    result = cloudinary.uploader.upload(
-                        io.BytesIO(buffer),
-                        folder=f'hebrew_ocr/lines/{document_id}',
-                        public_id=f"line_{line_data['line_order']}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    )
-                    line_image_path = result['public_id']
-                    line_image_url = result['secure_url']
-                else:
-                    continue
-            else:
-                line_folder = os.path.join(Config.UPLOAD_FOLDER, f'lines/{document_id}')
-                os.makedirs(line_folder, exist_ok=True)
-
-                line_image_path = os.path.join(
-                    line_folder,
-                    f"line_{line_data['line_order']}.png"
+        # Save line images
+        if Config.STORAGE_TYPE == 'cloudinary':
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            uploads = _upload_pngs(
+                [line_data['image'] for line_data in lines],
+                f'hebrew_ocr/lines/{document_id}',
+                [f"line_{line_data['line_order']}_{timestamp}" for line_data in lines]
+            )
+            saved = [
+                (result['public_id'], result['secure_url']) if result else None
+                for result in uploads
+            ]
+        else:
+            line_folder = os.path.join(Config.UPLOAD_FOLDER, f'lines/{document_id}')
+            os.makedirs(line_folder, exist_ok=True)
+
+            saved = [
+                (
+                    os.path.join(line_folder, f"line_{line_data['line_order']}.png"),
+                    f"/uploads/lines/{document_id}/line_{line_data['line_order']}.png"
                 )
-                ImageProcessor.save_image(line_img, line_image_path)
-                line_image_url = f"/uploads/lines/{document_id}/line_{line_data['line_order']}.png"
-
-            # Save to database
-            line = Line(
-                document_id=document_id,
-                image_path=line_image_path,
-                line_order=line_data['line_order'],
-                bbox_y_start=line_data['y_start'],
-                bbox_y_end=line_data['y_end']
+                for line_data in lines
+            ]
+            _save_pngs(
+                [line_data['image'] for line_data in lines],
+                [line_image_path for line_image_path, _ in saved]
             )
-            db.session.add(line)
-            db.session.flush()
 
-            result_lines.append({
-                'id': line.id,
+        # Save lines to database in one batched insert
+        line_rows = []
+        line_results = []
+
+        for line_data, saved_image in zip(lines, saved):
+            if saved_image is None:
+                continue
+            line_image_path, line_image_url = saved_image
+
+            line_rows.append({
+                'document_id': document_id,
+                'image_path': line_image_path,
+                'line_order': line_data['line_order'],
+                'bbox_y_start': line_data['y_start'],
+                'bbox_y_end': line_data['y_end']
+            })
+            line_results.append((line_data, line_image_url))
+
+        line_ids = Line.bulk_create(db.session, line_rows)
+
+        result_lines = [
+            {
+                'id': line_id,
                 'line_order': line_data['line_order'],
                 'image_url': line_image_url,
                 'y_start': line_data['y_start'],
                 'y_end': line_data['y_end']
-            })
+            }
+            for line_id, (line_data, line_image_url) in zip(line_ids, line_results)
+        ]
 
         db.session.commit()
 
@@ -265,33 +402,32 @@ def segment_lines():
 def get_characters(document_id):
     """Get all characters for a document"""
     try:
-        characters = Character.query.filter_by(document_id=document_id).all()
+        characters = db.session.execute(
+            select(
+                Character.id,
+                Character.image_path,
+                Character.bbox_x,
+                Character.bbox_y,
+                Character.bbox_w,
+                Character.bbox_h,
+                Character.group_id,
+                Character.label
+            ).where(Character.document_id == document_id)
+        ).all()
 
         # Group by group_id
-        groups = {}
-        for char in characters:
-            group_id = char.group_id
-            if group_id not in groups:
-                groups[group_id] = []
-
-            # Get image URL
-            if Config.STORAGE_TYPE == 'cloudinary':
-                image_url = cloudinary.utils.cloudinary_url(char.image_path)[0]
-            else:
-                # Remove UPLOAD_FOLDER prefix to get relative path
-                relative_path = char.image_path.replace(Config.UPLOAD_FOLDER, '').lstrip('/')
-                image_url = f"/uploads/{relative_path}"
-
+        groups = defaultdict(list)
+        for char_id, image_path, x, y, w, h, group_id, label in characters:
             groups[group_id].append({
-                'id': char.id,
-                'image_url': image_url,
+                'id': char_id,
+                'image_url': _image_url(image_path),
                 'bbox': {
-                    'x': char.bbox_x,
-                    'y': char.bbox_y,
-                    'w': char.bbox_w,
-                    'h': char.bbox_h
+                    'x': x,
+                    'y': y,
+                    'w': w,
+                    'h': h
                 },
-                'label': char.label
+                'label': label
             })
 
         return jsonify({
@@ -307,26 +443,28 @@ def get_characters(document_id):
 def get_lines(document_id):
     """Get all lines for a document"""
     try:
-        lines = Line.query.filter_by(document_id=document_id).order_by(Line.line_order).all()
-
-        result_lines = []
-        for line in lines:
-            # Get image URL
-            if Config.STORAGE_TYPE == 'cloudinary':
-                image_url = cloudinary.utils.cloudinary_url(line.image_path)[0]
-            else:
-                # Remove UPLOAD_FOLDER prefix to get relative path
-                relative_path = line.image_path.replace(Config.UPLOAD_FOLDER, '').lstrip('/')
-                image_url = f"/uploads/{relative_path}"
-
-            result_lines.append({
-                'id': line.id,
-                'line_order': line.line_order,
-                'image_url': image_url,
-                'text': line.text,
-                'y_start': line.bbox_y_start,
-                'y_end': line.bbox_y_end
-            })
+        lines = db.session.execute(
+            select(
+                Line.id,
+                Line.line_order,
+                Line.image_path,
+                Line.text,
+                Line.bbox_y_start,
+                Line.bbox_y_end
+            ).where(Line.document_id == document_id).order_by(Line.line_order)
+        ).all()
+
+        result_lines = [
+            {
+                'id': line_id,
+                'line_order': line_order,
+                'image_url': _image_url(image_path),
+                'text': text,
+                'y_start': y_start,
+                'y_end': y_end
+            }
+            for line_id, line_order, image_path, text, y_start, y_end in lines
+        ]
 
         return jsonify({
             'success': True,
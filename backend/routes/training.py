@@ -1,58 +1,157 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app
 from backend.database.db import db
 from backend.database.models import Character, TrainingRun
 from backend.models.ocr_model import HebrewOCRModel, CharacterEncoder
 from backend.models.training import ModelTrainer, TrainingDataset
 from backend.services.image_processing import ImageProcessor
+from backend.services.image_fetcher import ImageFetcher
+from backend.services.crop_store import CropStore
 from backend.config import Config
+from sqlalchemy import select
+from tensorflow import keras
 import cloudinary.utils
 import os
 import json
+import cv2
+import numpy as np
+from dataclasses import dataclass, replace, asdict
 from datetime import datetime
 import threading
 import queue
 
 training_bp = Blueprint('training', __name__)
 
+
+@dataclass(frozen=True)
+class TrainingStatus:
+    """
+    Snapshot of the training state
+
+    Never mutated: writers build a new snapshot with dataclasses.replace()
+    and swap the module-level reference in one assignment, so a reader that
+    grabs training_status once always sees a consistent set of fields.
+    """
+    is_training: bool = False
+    current_epoch: int = 0
+    total_epochs: int = 0
+    loss: float = 0.0
+    accuracy: float = 0.0
+    num_samples: int = 0
+    progress: int = 0
+
+
 # Global training status
-training_status = {
-    'is_training': False,
-    'current_epoch': 0,
-    'total_epochs': 0,
-    'loss': 0.0,
-    'accuracy': 0.0,
-    'num_samples': 0,
-    'progress': 0
-}
+training_status = TrainingStatus()
+
+
+class ProgressBroadcaster:
+    """
+    Fan training progress out to every connected SSE client
 
-# Queue for progress updates
-progress_queue = queue.Queue()
+    Each subscriber gets its own bounded queue, so every client sees the
+    full stream and nothing accumulates while no client is listening. A
+    slow client loses its oldest updates rather than blocking training.
+    """
+
+    def __init__(self, maxsize=256):
+        self._maxsize = maxsize
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a new client queue"""
+        q = queue.Queue(maxsize=self._maxsize)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Remove a client queue"""
+        with self._lock:
+            self._subscribers.remove(q)
+
+    def publish(self, message):
+        """Push a message to every subscriber, dropping its oldest if full"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+# Progress updates for SSE clients
+progress_broadcaster = ProgressBroadcaster()
+
+# Constant keep-alive event sent when no update arrives within a second
+_HEARTBEAT_EVENT = f"data: {json.dumps({'heartbeat': True})}\n\n".encode('utf-8')
+
+
+def _character_image_url(image_path):
+    """
+    Cloudinary URL for a character crop already scaled to the model input size
+
+    The resize happens on the CDN (and is cached there), so training downloads
+    IMAGE_SIZE PNGs instead of the full crops. 'scale' matches the stretch
+    resize done locally, and PNG keeps the glyphs lossless.
+    """
+    width, height = Config.IMAGE_SIZE
+    return cloudinary.utils.cloudinary_url(
+        image_path,
+        width=width,
+        height=height,
+        crop='scale',
+        format='png'
+    )[0]
 
 
 def progress_callback(epoch, logs):
     """Callback for training progress"""
     global training_status
 
-    training_status['current_epoch'] = epoch + 1
-    training_status['loss'] = logs.get('loss', 0.0)
-    training_status['accuracy'] = logs.get('accuracy', 0.0)
-    training_status['progress'] = int((epoch + 1) / training_status['total_epochs'] * 100)
-
-    # Add to queue for SSE
-    progress_queue.put({
-        'epoch': epoch + 1,
-        'total_epochs': training_status['total_epochs'],
-        'loss': training_status['loss'],
-        'accuracy': training_status['accuracy'],
-        'progress': training_status['progress']
+    status = replace(
+        training_status,
+        current_epoch=epoch + 1,
+        loss=logs.get('loss', 0.0),
+        accuracy=logs.get('accuracy', 0.0),
+        progress=int((epoch + 1) / training_status.total_epochs * 100)
+    )
+    training_status = status
+
+    # Publish for SSE
+    progress_broadcaster.publish({
+        'epoch': status.current_epoch,
+        'total_epochs': status.total_epochs,
+        'loss': status.loss,
+        'accuracy': status.accuracy,
+        'progress': status.progress
     })
 
 
-def train_model_thread(characters_data, epochs, batch_size, learning_rate):
-    """Train model in separate thread"""
+def train_model_thread(app, characters, epochs, batch_size, learning_rate):
+    """Load character images and train the model in a separate thread"""
+    with app.app_context():
+        _train_model(characters, epochs, batch_size, learning_rate)
+
+
+def _train_model(characters, epochs, batch_size, learning_rate):
+    """Body of train_model_thread (runs inside an app context)"""
     global training_status
 
     try:
+        # Image loading happens here, off the request thread
+        characters_data = _load_characters_data(characters)
+        training_status = replace(training_status, num_samples=len(characters_data))
+
+        print(f"Loaded {len(characters_data)} character images")
+
         # Create character encoder
         char_encoder = CharacterEncoder(Config.HEBREW_CHARS)
 
@@ -91,8 +190,8 @@ def train_model_thread(characters_data, epochs, batch_size, learning_rate):
         db.session.commit()
 
         # Update status
-        training_status['is_training'] = False
-        progress_queue.put({
+        training_status = replace(training_status, is_training=False)
+        progress_broadcaster.publish({
             'status': 'completed',
             'test_accuracy': result['test_metrics']['accuracy'],
             'test_loss': result['test_metrics']['loss'],
@@ -100,13 +199,90 @@ def train_model_thread(characters_data, epochs, batch_size, learning_rate):
         })
 
     except Exception as e:
-        training_status['is_training'] = False
-        progress_queue.put({
+        training_status = replace(training_status, is_training=False)
+        progress_broadcaster.publish({
             'status': 'error',
             'error': str(e)
         })
 
 
+def _labeled_characters(document_ids=None):
+    """
+    Select the valid labeled characters, optionally limited to some documents
+
+    Only the columns needed to find and label their images are loaded, as
+    plain rows rather than ORM objects.
+    """
+    query = select(
+        Character.id,
+        Character.document_id,
+        Character.image_path,
+        Character.label
+    ).where(
+        Character.label.isnot(None),
+        Character.is_valid == True
+    )
+
+    if document_ids:
+        query = query.where(Character.document_id.in_(document_ids))
+
+    return db.session.execute(query).all()
+
+
+def _load_characters_data(characters):
+    """
+    Load labeled character images for training
+
+    Crops stored by CropStore at segmentation time are read from the
+    memory-mapped per-document arrays; anything else is loaded from storage.
+
+    Returns:
+        List of character dictionaries with 'image' (IMAGE_SIZE uint8, a
+        view into one shared array) and 'label'
+    """
+    # Every image is resized into one preallocated uint8 array as it is
+    # loaded, so full-size crops are never held for the whole dataset
+    w, h = Config.IMAGE_SIZE
+    images = np.empty((len(characters), h, w), dtype=np.uint8)
+    loaded = np.zeros(len(characters), dtype=bool)
+
+    def store(i, img):
+        if img is not None:
+            cv2.resize(img, Config.IMAGE_SIZE, dst=images[i])
+            loaded[i] = True
+
+    crops_by_document = {}
+    for i, char in enumerate(characters):
+        if char.document_id not in crops_by_document:
+            crops_by_document[char.document_id] = CropStore.load(char.document_id)
+
+        store(i, crops_by_document[char.document_id].get(char.id))
+
+    # Load character images missing from the crop store
+    missing = np.flatnonzero(~loaded).tolist()
+    if missing:
+        if Config.STORAGE_TYPE == 'cloudinary':
+            # Fetched concurrently over pooled connections (already IMAGE_SIZE on the CDN)
+            fetched = ImageFetcher.fetch_images(
+                _character_image_url(characters[i].image_path) for i in missing
+            )
+            for i, img in zip(missing, fetched):
+                store(i, img)
+        else:
+            for i in missing:
+                store(i, ImageProcessor.load_image_from_path(characters[i].image_path))
+
+    characters_data = [
+        {
+            'image': images[i],
+            'label': characters[i].label
+        }
+        for i in np.flatnonzero(loaded).tolist()
+    ]
+
+    return characters_data
+
+
 @training_bp.route('/api/train', methods=['POST'])
 def train():
     """
@@ -125,7 +301,7 @@ def train():
     global training_status
 
     try:
-        if training_status['is_training']:
+        if training_status.is_training:
             return jsonify({'error': 'Training already in progress'}), 400
 
         data = request.get_json() or {}
@@ -135,57 +311,25 @@ def train():
         batch_size = data.get('batch_size', Config.BATCH_SIZE)
         learning_rate = data.get('learning_rate', Config.LEARNING_RATE)
 
-        # Load all labeled characters from database
-        characters = Character.query.filter(
-            Character.label.isnot(None),
-            Character.is_valid == True
-        ).all()
+        # Load all labeled characters from database (plain rows the thread can keep)
+        characters = _labeled_characters()
 
         if len(characters) < 10:
             return jsonify({'error': 'Not enough labeled characters. Need at least 10.'}), 400
 
         print(f"Found {len(characters)} labeled characters")
 
-        # Prepare character data
-        characters_data = []
-
-        for char in characters:
-            # Load character image
-            if Config.STORAGE_TYPE == 'cloudinary':
-                import requests
-                img_url = cloudinary.utils.cloudinary_url(char.image_path)[0]
-                response = requests.get(img_url)
-                img = ImageProcessor.load_image_from_bytes(response.content)
-            else:
-                img = ImageProcessor.load_image_from_path(char.image_path)
-
-            if img is not None:
-                characters_data.append({
-                    'image': img,
-                    'label': char.label
-                })
-
-        print(f"Loaded {len(characters_data)} character images")
-
         # Initialize training status
-        training_status = {
-            'is_training': True,
-            'current_epoch': 0,
-            'total_epochs': epochs,
-            'loss': 0.0,
-            'accuracy': 0.0,
-            'num_samples': len(characters_data),
-            'progress': 0
-        }
-
-        # Clear progress queue
-        while not progress_queue.empty():
-            progress_queue.get()
+        training_status = TrainingStatus(
+            is_training=True,
+            total_epochs=epochs,
+            num_samples=len(characters)
+        )
 
-        # Start training in separate thread
+        # Load images and train in a separate thread; respond right away
         thread = threading.Thread(
             target=train_model_thread,
-            args=(characters_data, epochs, batch_size, learning_rate)
+            args=(current_app._get_current_object(), characters, epochs, batch_size, learning_rate)
         )
         thread.daemon = True
         thread.start()
@@ -193,12 +337,12 @@ def train():
         return jsonify({
             'success': True,
             'message': 'Training started',
-            'num_samples': len(characters_data),
+            'num_samples': len(characters),
             'epochs': epochs
-        }), 200
+        }), 202
 
     except Exception as e:
-        training_status['is_training'] = False
+        training_status = replace(training_status, is_training=False)
         return jsonify({'error': str(e)}), 500
 
 
@@ -207,7 +351,7 @@ def get_training_status():
     """Get current training status"""
     return jsonify({
         'success': True,
-        'status': training_status
+        'status': asdict(training_status)
     }), 200
 
 
@@ -220,27 +364,72 @@ def training_progress_stream():
         SSE stream with training updates
     """
     def generate():
-        while True:
-            try:
-                # Wait for progress update (with timeout)
-                progress = progress_queue.get(timeout=1)
+        progress_queue = progress_broadcaster.subscribe()
+        try:
+            while True:
+                try:
+                    # Wait for progress update (with timeout)
+                    progress = progress_queue.get(timeout=1)
+
+                    # Send it together with any updates already queued
+                    # behind it, as one write
+                    events = [f"data: {json.dumps(progress)}\n\n"]
+                    finished = progress.get('status') in ['completed', 'error']
+                    while not finished:
+                        try:
+                            progress = progress_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        events.append(f"data: {json.dumps(progress)}\n\n")
+                        finished = progress.get('status') in ['completed', 'error']
+
+                    # Bytes: direct_passthrough skips Werkzeug's str encoding
+                    yield ''.join(events).encode('utf-8')
+
+                    # Check if training completed or errored
+                    if finished:
+                        break
+
+                except queue.Empty:
+                    # Send heartbeat
+                    yield _HEARTBEAT_EVENT
+
+                except Exception as e:
+                    yield f"data: {json.dumps({'error': str(e)})}\n\n".encode('utf-8')
+                    break
+        finally:
+            # Runs on normal end and when the client disconnects
+            progress_broadcaster.unsubscribe(progress_queue)
 
-                # Send progress as SSE
-                yield f"data: {json.dumps(progress)}\n\n"
+    return Response(generate(), mimetype='text/event-stream', direct_passthrough=True)
 
-                # Check if training completed or errored
-                if progress.get('status') in ['completed', 'error']:
-                    break
 
-            except queue.Empty:
-                # Send heartbeat
-                yield f"data: {json.dumps({'heartbeat': True})}\n\n"
+# Last model retrain started from: the loaded Keras model (used only as an
+# architecture template) and a snapshot of its saved weights. Retraining
+# always starts from the latest saved model, so repeated calls clone the
+# template instead of re-reading the file.
+_retrain_base = {'path': None, 'model': None, 'weights': None}
+_retrain_lock = threading.Lock()
 
-            except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                break
 
-    return Response(generate(), mimetype='text/event-stream')
+def _load_retrain_base(model_path, num_classes):
+    """
+    A fresh copy of the model saved at model_path
+
+    Every caller gets its own clone with the saved weights, so concurrent
+    retrains train independently; the lock only guards the cache itself.
+    """
+    with _retrain_lock:
+        if _retrain_base['path'] != model_path:
+            base = HebrewOCRModel(num_classes=num_classes, image_size=Config.IMAGE_SIZE)
+            base.load_model(model_path)
+            _retrain_base.update(path=model_path, model=base.model, weights=base.model.get_weights())
+        template, weights = _retrain_base['model'], _retrain_base['weights']
+
+    model = HebrewOCRModel(num_classes=num_classes, image_size=Config.IMAGE_SIZE)
+    model.model = keras.models.clone_model(template)
+    model.model.set_weights(weights)
+    return model
 
 
 @training_bp.route('/api/retrain', methods=['POST'])
@@ -267,59 +456,32 @@ def retrain():
         learning_rate = data.get('learning_rate', 0.0001)
 
         # Load new labeled characters
-        query = Character.query.filter(
-            Character.label.isnot(None),
-            Character.is_valid == True
-        )
-
-        if document_ids:
-            query = query.filter(Character.document_id.in_(document_ids))
-
-        characters = query.all()
+        characters = _labeled_characters(document_ids)
 
         if len(characters) < 5:
             return jsonify({'error': 'Not enough new labeled characters'}), 400
 
         # Prepare character data
-        characters_data = []
-
-        for char in characters:
-            # Load character image
-            if Config.STORAGE_TYPE == 'cloudinary':
-                import requests
-                img_url = cloudinary.utils.cloudinary_url(char.image_path)[0]
-                response = requests.get(img_url)
-                img = ImageProcessor.load_image_from_bytes(response.content)
-            else:
-                img = ImageProcessor.load_image_from_path(char.image_path)
-
-            if img is not None:
-                characters_data.append({
-                    'image': img,
-                    'label': char.label
-                })
+        characters_data = _load_characters_data(characters)
 
         # Create character encoder
         char_encoder = CharacterEncoder(Config.HEBREW_CHARS)
 
-        # Load existing model
-        model = HebrewOCRModel(
-            num_classes=char_encoder.get_num_classes(),
-            image_size=Config.IMAGE_SIZE
-        )
-
-        # Get latest model
-        latest_run = TrainingRun.query.order_by(TrainingRun.trained_at.desc()).first()
+        # Get latest model (an index scan on trained_at, one column)
+        latest_version = db.session.execute(
+            select(TrainingRun.model_version).order_by(TrainingRun.trained_at.desc()).limit(1)
+        ).scalar_one_or_none()
 
-        if latest_run:
-            model_path = os.path.join(Config.MODEL_PATH, latest_run.model_version)
-            if os.path.exists(model_path):
-                model.load_model(model_path)
-            else:
+        if latest_version:
+            model_path = os.path.join(Config.MODEL_PATH, latest_version)
+            if not os.path.exists(model_path):
                 return jsonify({'error': 'Existing model not found'}), 404
         else:
             return jsonify({'error': 'No existing model to retrain'}), 404
 
+        # Load existing model
+        model = _load_retrain_base(model_path, char_encoder.get_num_classes())
+
         # Create trainer
         trainer = ModelTrainer(model, char_encoder)
 
@@ -349,11 +511,21 @@ def retrain():
 def list_models():
     """List all trained models"""
     try:
-        training_runs = TrainingRun.query.order_by(TrainingRun.trained_at.desc()).all()
+        rows = db.session.execute(
+            select(
+                TrainingRun.id,
+                TrainingRun.model_version,
+                TrainingRun.num_samples,
+                TrainingRun.accuracy,
+                TrainingRun.loss,
+                TrainingRun.trained_at
+            ).order_by(TrainingRun.trained_at.desc())
+        ).mappings().all()
+        training_runs = [dict(row) for row in rows]
 
         return jsonify({
             'success': True,
-            'models': [run.to_dict() for run in training_runs],
+            'models': training_runs,
             'total': len(training_runs)
         }), 200
 
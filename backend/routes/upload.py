@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
+from sqlalchemy import select
 import os
+import uuid
+import cv2
 from backend.database.db import db
 from backend.database.models import Document
 from backend.services.image_processing import ImageProcessor
@@ -8,6 +11,7 @@ import cloudinary
 import cloudinary.uploader
 from backend.config import Config
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -17,6 +21,58 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 
+def _upload_payload(file_bytes, img, resized, filename):
+    """
+    Bytes to send to Cloudinary for an uploaded image
+
+    The untouched file when it was small enough; otherwise the downscaled
+    image re-encoded in the file's own format, so oversized originals are
+    not shipped (and stored) at full size.
+    """
+    if not resized:
+        return file_bytes
+
+    ext = os.path.splitext(filename)[1].lower() or '.png'
+    success, buffer = cv2.imencode(ext, img)
+    return buffer.tobytes() if success else file_bytes
+
+
+def _process_one(file_bytes, filename, stamp, upload_folder=None):
+    """
+    Decode, resize and store one uploaded image (safe to run off the request thread)
+
+    Does not touch db.session; the caller creates the Document rows. stamp
+    prefixes the stored name and must be unique within the batch.
+
+    Returns:
+        ({'image_path', 'image_url'}, None) on success, (None, error message) otherwise
+    """
+    try:
+        # Load and validate image (scaled down if too large)
+        img, resized = ImageProcessor.load_fitted_image_from_bytes(file_bytes)
+        if img is None:
+            return None, 'Invalid image file'
+
+        # Save image
+        if Config.STORAGE_TYPE == 'cloudinary':
+            result = cloudinary.uploader.upload(
+                _upload_payload(file_bytes, img, resized, filename),
+                folder='hebrew_ocr/originals',
+                public_id=f"{stamp}_{filename}"
+            )
+            image_url = result['secure_url']
+            image_path = result['public_id']
+        else:
+            image_path = os.path.join(upload_folder, f"original_{stamp}_{filename}")
+            ImageProcessor.save_image(img, image_path)
+            image_url = f"/uploads/{os.path.basename(image_path)}"
+
+        return {'image_path': image_path, 'image_url': image_url}, None
+
+    except Exception as e:
+        return None, str(e)
+
+
 @upload_bp.route('/api/upload', methods=['POST'])
 def upload_image():
     """
@@ -42,19 +98,16 @@ def upload_image():
         file_bytes = file.read()
         filename = secure_filename(file.filename)
 
-        # Load and validate image
-        img = ImageProcessor.load_image_from_bytes(file_bytes)
+        # Load and validate image (scaled down if too large)
+        img, resized = ImageProcessor.load_fitted_image_from_bytes(file_bytes)
         if img is None:
             return jsonify({'error': 'Invalid image file'}), 400
 
-        # Resize if too large
-        img = ImageProcessor.resize_image(img)
-
         # Save image
         if Config.STORAGE_TYPE == 'cloudinary':
             # Upload to Cloudinary
             result = cloudinary.uploader.upload(
-                file_bytes,
+                _upload_payload(file_bytes, img, resized, filename),
                 folder='hebrew_ocr/originals',
                 public_id=f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
             )
@@ -109,66 +162,63 @@ def batch_upload():
         if not files:
             return jsonify({'error': 'No files selected'}), 400
 
-        uploaded_documents = []
         errors = []
 
+        upload_folder = None
+        if Config.STORAGE_TYPE != 'cloudinary':
+            upload_folder = Config.UPLOAD_FOLDER
+            os.makedirs(upload_folder, exist_ok=True)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        # Request streams are not thread-safe: read every file here, then
+        # decode and store them concurrently
+        pending = []
         for file in files:
-            try:
-                if file.filename == '':
-                    continue
-
-                if not allowed_file(file.filename):
-                    errors.append(f"{file.filename}: File type not allowed")
-                    continue
-
-                # Read file
-                file_bytes = file.read()
-                filename = secure_filename(file.filename)
-
-                # Load and validate image
-                img = ImageProcessor.load_image_from_bytes(file_bytes)
-                if img is None:
-                    errors.append(f"{filename}: Invalid image file")
-                    continue
-
-                # Resize if too large
-                img = ImageProcessor.resize_image(img)
-
-                # Save image
-                if Config.STORAGE_TYPE == 'cloudinary':
-                    result = cloudinary.uploader.upload(
-                        file_bytes,
-                        folder='hebrew_ocr/originals',
-                        public_id=f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                    )
-                    image_url = result['secure_url']
-                    image_path = result['public_id']
-                else:
-                    upload_folder = Config.UPLOAD_FOLDER
-                    os.makedirs(upload_folder, exist_ok=True)
-
-                    image_path = os.path.join(upload_folder, f"original_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
-                    ImageProcessor.save_image(img, image_path)
-                    image_url = f"/uploads/{os.path.basename(image_path)}"
-
-                # Save to database
-                document = Document(
-                    filename=filename,
-                    original_image_path=image_path,
-                    status='uploaded'
-                )
-                db.session.add(document)
-                db.session.commit()
-
-                uploaded_documents.append({
-                    'document_id': document.id,
-                    'image_url': image_url,
-                    'filename': filename
-                })
-
-            except Exception as e:
-                errors.append(f"{file.filename}: {str(e)}")
+            if file.filename == '':
+                continue
+
+            if not allowed_file(file.filename):
+                errors.append(f"{file.filename}: File type not allowed")
+                continue
+
+            # Files of one batch share a timestamp; the random suffix keeps
+            # same-named files (in this or a concurrent batch) apart
+            stamp = f"{timestamp}_{uuid.uuid4().hex[:8]}"
+            pending.append((file.read(), secure_filename(file.filename), stamp))
+
+        results = []
+        if pending:
+            workers = min(Config.CLOUDINARY_UPLOAD_WORKERS, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda item: _process_one(*item, upload_folder), pending
+                ))
+
+        # Database work stays on the request thread: one multi-row
+        # INSERT ... RETURNING and one commit for the whole batch
+        stored = []
+        for (_, filename, _), (result, error) in zip(pending, results):
+            if error is not None:
+                errors.append(f"{filename}: {error}")
                 continue
+            stored.append((filename, result))
+
+        document_ids = Document.bulk_create(db.session, [
+            {
+                'filename': filename,
+                'original_image_path': result['image_path'],
+                'status': 'uploaded'
+            }
+            for filename, result in stored
+        ])
+        if document_ids:
+            db.session.commit()
+
+        uploaded_documents = [
+            {'document_id': document_id, 'image_url': result['image_url'], 'filename': filename}
+            for document_id, (filename, result) in zip(document_ids, stored)
+        ]
 
         return jsonify({
             'success': True,
@@ -205,11 +255,21 @@ def get_document(document_id):
 def list_documents():
     """List all documents"""
     try:
-        documents = Document.query.order_by(Document.upload_date.desc()).all()
+        rows = db.session.execute(
+            select(
+                Document.id,
+                Document.filename,
+                Document.original_image_path,
+                Document.enhanced_image_path,
+                Document.upload_date,
+                Document.status
+            ).order_by(Document.upload_date.desc())
+        ).mappings().all()
+        documents = [dict(row) for row in rows]
 
         return jsonify({
             'success': True,
-            'documents': [doc.to_dict() for doc in documents],
+            'documents': documents,
             'total': len(documents)
         }), 200
 
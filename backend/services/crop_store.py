@@ -0,0 +1,57 @@
+import os
+import cv2
+import numpy as np
+from backend.config import Config
+
+
+class CropStore:
+    """Per-document store of character crops as stacked NumPy arrays
+
+    Each segmented document gets ``crops/<document_id>/images.npy`` holding a
+    uint8 (N, H, W) tensor of model-size crops plus ``ids.npy`` with the
+    matching Character ids. Training memory-maps these instead of opening
+    one image file per character.
+    """
+
+    @staticmethod
+    def _folder(document_id):
+        return os.path.join(Config.UPLOAD_FOLDER, 'crops', str(document_id))
+
+    @staticmethod
+    def save(document_id, character_ids, images, image_size=Config.IMAGE_SIZE):
+        """
+        Save character crops for a document
+
+        Args:
+            document_id: Document id
+            character_ids: Character ids, one per image
+            images: Grayscale character images (any size)
+            image_size: Stored crop size (width, height)
+        """
+        w, h = image_size
+        crops = np.empty((len(images), h, w), dtype=np.uint8)
+        for i, img in enumerate(images):
+            cv2.resize(img, image_size, dst=crops[i])
+
+        folder = CropStore._folder(document_id)
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, 'images.npy'), crops)
+        np.save(os.path.join(folder, 'ids.npy'), np.asarray(character_ids, dtype=np.int64))
+
+    @staticmethod
+    def load(document_id):
+        """
+        Memory-map the crops of a document
+
+        Returns:
+            Dictionary mapping character id to its (H, W) uint8 crop,
+            or an empty dictionary if the document has no stored crops
+        """
+        folder = CropStore._folder(document_id)
+        try:
+            crops = np.load(os.path.join(folder, 'images.npy'), mmap_mode='r')
+            ids = np.load(os.path.join(folder, 'ids.npy'))
+        except (OSError, ValueError):
+            return {}
+
+        return {int(char_id): crops[i] for i, char_id in enumerate(ids)}
@@ -3,6 +3,37 @@ import numpy as np
 from PIL import Image
 import io
 import base64
+import threading
+
+# OpenCV builds with CUDA expose a GPU non-local-means denoiser
+_CUDA_DENOISE = (
+    hasattr(cv2, 'cuda')
+    and hasattr(cv2.cuda, 'fastNlMeansDenoising')
+    and cv2.cuda.getCudaEnabledDeviceCount() > 0
+)
+_gpu_buffers = threading.local()
+
+# libjpeg-turbo's TurboJPEG API decodes JPEGs noticeably faster than imdecode;
+# it is optional and needs the system libturbojpeg next to the Python package
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJPF_BGR
+    _TURBOJPEG = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _TURBOJPEG = None
+
+_JPEG_MAGIC = b'\xff\xd8\xff'
+
+# imdecode flags for JPEG DCT-domain downscaling, by reduction factor
+_REDUCED_GRAYSCALE = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+_REDUCED_COLOR = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
 
 class ImageProcessor:
     """Service for image enhancement and preprocessing"""
@@ -23,35 +54,44 @@ class ImageProcessor:
         Returns:
             Enhanced image as numpy array
         """
-        # Convert to numpy array if PIL Image
+        # Convert to numpy array if PIL Image. The caller's array is never
+        # copied or written: each step below writes into a buffer this
+        # function owns, allocating it at the first step that runs.
         if isinstance(image_data, Image.Image):
             img = np.array(image_data)
         else:
-            img = image_data.copy()
+            img = image_data
 
         # Convert to grayscale if color
         if len(img.shape) == 3:
             img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
-        # Apply brightness and contrast
-        img = cv2.convertScaleAbs(img, alpha=contrast, beta=brightness)
+        owned = img is not image_data
+
+        # Apply brightness and contrast (an identity scale of a uint8 image
+        # is skipped rather than run as a full-image copy)
+        if contrast != 1.0 or brightness != 0 or img.dtype != np.uint8:
+            img = cv2.convertScaleAbs(img, alpha=contrast, beta=brightness)
+            owned = True
 
         # Apply Gaussian blur for noise reduction
         if blur > 0:
             # Ensure kernel size is odd
             kernel_size = blur if blur % 2 == 1 else blur + 1
-            img = cv2.GaussianBlur(img, (kernel_size, kernel_size), 0)
+            img = cv2.GaussianBlur(img, (kernel_size, kernel_size), 0, dst=img if owned else None)
+            owned = True
 
         # Apply sharpening
         if sharpen > 0:
             kernel = np.array([[-1, -1, -1],
                              [-1, 9 + sharpen, -1],
                              [-1, -1, -1]])
-            img = cv2.filter2D(img, -1, kernel)
+            img = cv2.filter2D(img, -1, kernel, dst=img if owned else None)
+            owned = True
 
         # Apply binary threshold
         if threshold is not None:
-            _, img = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
+            _, img = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY, dst=img if owned else None)
 
         return img
 
@@ -61,28 +101,86 @@ class ImageProcessor:
         return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
 
     @staticmethod
-    def load_image_from_bytes(image_bytes):
-        """Load image from bytes"""
+    def load_image_from_bytes(image_bytes, grayscale=True):
+        """Load image from bytes (decoded straight to grayscale by default)"""
+        # imdecode honours EXIF orientation and TurboJPEG doesn't, so photos
+        # carrying an Exif header (APP0/APP1 sit right after SOI) stay on OpenCV
+        if (_TURBOJPEG is not None
+                and image_bytes[:3] == _JPEG_MAGIC
+                and image_bytes.find(b'Exif\x00\x00', 0, 64) == -1):
+            try:
+                img = _TURBOJPEG.decode(
+                    image_bytes, pixel_format=TJPF_GRAY if grayscale else TJPF_BGR
+                )
+                return img.reshape(img.shape[:2]) if grayscale else img
+            except OSError:
+                pass  # Let OpenCV handle (or reject) what libjpeg-turbo can't
+
+        # frombuffer is a zero-copy view over the encoded bytes
         nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        img = cv2.imdecode(nparr, flags)
         return img
 
     @staticmethod
-    def save_image(img, output_path):
-        """Save image to file"""
-        cv2.imwrite(output_path, img)
+    def load_fitted_image_from_bytes(image_bytes, max_width=2000, max_height=2000, grayscale=True):
+        """
+        Load image from bytes, scaled down to fit max_width x max_height
+
+        Oversized JPEGs are decoded at 1/2, 1/4 or 1/8 scale (libjpeg's DCT
+        scaling, nearly free) when that still leaves at least the target
+        size, so resize_image only makes the final fit instead of shrinking
+        a full-resolution decode.
+
+        Returns:
+            Tuple (image or None, whether it was scaled down)
+        """
+        factor = 1
+        if image_bytes[:3] == _JPEG_MAGIC:
+            try:
+                # Reads the header only; no pixels are decoded
+                w, h = Image.open(io.BytesIO(image_bytes)).size
+                limit = max(w / max_width, h / max_height)
+                factor = next((f for f in (8, 4, 2) if f <= limit), 1)
+            except (OSError, ValueError):
+                pass  # Undecodable header: leave it to imdecode to reject
+
+        if factor == 1:
+            img = ImageProcessor.load_image_from_bytes(image_bytes, grayscale=grayscale)
+        else:
+            flags = _REDUCED_GRAYSCALE[factor] if grayscale else _REDUCED_COLOR[factor]
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags)
+
+        if img is None:
+            return None, False
+
+        fitted = ImageProcessor.resize_image(img, max_width, max_height)
+        return fitted, factor > 1 or fitted is not img
+
+    @staticmethod
+    def save_image(img, output_path, params=()):
+        """Save image to file (params: OpenCV imwrite flags, e.g. PNG compression)"""
+        cv2.imwrite(output_path, img, list(params))
 
     @staticmethod
-    def image_to_base64(img):
-        """Convert numpy image to base64 string"""
-        # Encode image to PNG
-        success, buffer = cv2.imencode('.png', img)
+    def image_to_base64(img, fmt='png', quality=90):
+        """
+        Convert numpy image to a base64 data URL
+
+        PNG (lossless, right for binarized pages) is written at zlib level 1,
+        several times faster to encode than the default for a slightly larger
+        payload; fmt='jpeg' suits photographic previews.
+        """
+        if fmt == 'jpeg':
+            success, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        else:
+            success, buffer = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
         if not success:
             raise ValueError("Failed to encode image")
 
-        # Convert to base64
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
-        return f"data:image/png;base64,{img_base64}"
+        # Convert to base64 (straight from the encoder's buffer, no bytes copy)
+        img_base64 = base64.b64encode(buffer).decode('ascii')
+        return f"data:image/{fmt};base64,{img_base64}"
 
     @staticmethod
     def base64_to_image(base64_string):
@@ -113,10 +211,13 @@ class ImageProcessor:
     @staticmethod
     def auto_rotate(img):
         """Auto-rotate image to correct orientation"""
-        # Detect text orientation using OpenCV
-        coords = np.column_stack(np.where(img > 0))
-        if len(coords) == 0:
+        # Detect text orientation using OpenCV. findNonZero returns int32
+        # (x, y) points in one pass; flip them to the (row, col) order the
+        # angle convention below was written for
+        points = cv2.findNonZero(img)
+        if points is None:
             return img
+        coords = np.ascontiguousarray(points[:, 0, ::-1])
 
         angle = cv2.minAreaRect(coords)[-1]
 
@@ -139,14 +240,16 @@ class ImageProcessor:
         """Remove white borders from image"""
         # Find non-white regions
         mask = img < border_threshold
-        coords = np.argwhere(mask)
 
-        if len(coords) == 0:
+        # Get bounding box from the row/column projections of the mask,
+        # without listing every foreground pixel
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
             return img
+        cols = np.flatnonzero(mask.any(axis=0))
 
-        # Get bounding box
-        y_min, x_min = coords.min(axis=0)
-        y_max, x_max = coords.max(axis=0)
+        y_min, y_max = rows[0], rows[-1]
+        x_min, x_max = cols[0], cols[-1]
 
         # Crop image
         cropped = img[y_min:y_max+1, x_min:x_max+1]
@@ -154,7 +257,21 @@ class ImageProcessor:
 
     @staticmethod
     def denoise(img, strength=10):
-        """Apply denoising to image"""
+        """Apply denoising to image (on the GPU when OpenCV has CUDA)"""
+        if _CUDA_DENOISE:
+            # Device buffers are kept per thread; upload() only reallocates
+            # when the page size changes, so repeat calls skip cudaMalloc
+            buffers = getattr(_gpu_buffers, 'denoise', None)
+            if buffers is None:
+                buffers = _gpu_buffers.denoise = (cv2.cuda_GpuMat(), cv2.cuda_GpuMat())
+            gpu_img, gpu_out = buffers
+            gpu_img.upload(img)
+            cv2.cuda.fastNlMeansDenoising(
+                gpu_img, strength, dst=gpu_out, search_window=21, block_size=7
+            )
+            return gpu_out.download()
+        # The CPU version already splits the image into stripes across
+        # OpenCV's thread pool, so it uses every core without tiling here
         return cv2.fastNlMeansDenoising(img, None, strength, 7, 21)
 
     @staticmethod
@@ -168,6 +285,24 @@ class ImageProcessor:
             c
         )
 
+    @staticmethod
+    def auto_preprocess(img, strength=10):
+        """
+        Default preprocessing pipeline for scanned documents
+
+        Args:
+            img: Grayscale image
+            strength: Denoising strength
+
+        Returns:
+            Preprocessed binary image
+        """
+        img = ImageProcessor.denoise(img, strength=strength)
+        img = ImageProcessor.auto_rotate(img)
+        img = ImageProcessor.invert_if_needed(img)
+        img = ImageProcessor.remove_borders(img)
+        return ImageProcessor.adaptive_threshold(img)
+
     @staticmethod
     def invert_if_needed(img):
         """Invert image if background is dark"""
@@ -0,0 +1,43 @@
+import numpy as np
+
+from backend.models.training import TrainingDataset
+
+
+def _dataset(y):
+    dataset = TrainingDataset([], char_encoder=None)
+    dataset.y = np.asarray(y, dtype=np.int64)
+    dataset.X = np.zeros((len(dataset.y), 32, 32, 1), dtype=np.float32)
+    return dataset
+
+
+def test_split_small_many_class_dataset():
+    # A typical retrain: 50 characters over 15 letters, every letter seen
+    # at least twice -- too few rows per split to stratify on 15 classes
+    y = np.repeat(np.arange(15), 3)
+    y = np.concatenate([y, np.arange(5)])
+    dataset = _dataset(y)
+
+    X_train, X_val, X_test, y_train, y_val, y_test = dataset.split_data()
+
+    assert len(y_train) + len(y_val) + len(y_test) == 50
+    assert len(X_train) == len(y_train)
+    assert sorted(np.concatenate([y_train, y_val, y_test]).tolist()) == sorted(y.tolist())
+
+
+def test_split_full_alphabet_below_stratify_threshold():
+    # 35 classes, 100 rows: the test share (20) is smaller than the class count
+    y = np.concatenate([np.repeat(np.arange(35), 2), np.arange(30)])
+    _, _, _, y_train, y_val, y_test = _dataset(y).split_data()
+
+    assert len(y_train) + len(y_val) + len(y_test) == 100
+
+
+def test_stratify_labels():
+    y = np.repeat(np.arange(5), 20)
+    assert TrainingDataset._stratify_labels(y, 0.2) is y
+
+    # A singleton class can't be stratified
+    assert TrainingDataset._stratify_labels(np.append(y, 5), 0.2) is None
+
+    # Test share of 2 rows can't hold 5 classes
+    assert TrainingDataset._stratify_labels(y[::10], 0.2) is None